@@ -0,0 +1,258 @@
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+author: Seonil Kim(@sikim-piolink)
+callback: wfk_latency
+callback_type: aggregate
+short_description: WEBFRONT-K REST API latency histograms of a play
+description:
+  - Gathers the C(trace) of the results of the pio_* modules and builds the latency
+    percentiles (p50, p95, p99) of the REST calls per device, endpoint and module.
+  - Prints a summary at the end of the playbook and optionally writes a Prometheus
+    textfile collector file and a JSON report.
+  - The modules running on the controller are traced unless C(WFK_TRACE) is already set,
+    other tasks need C(trace) or C(WFK_TRACE=1) in their C(environment).
+version_added: '2.10'
+requirements:
+  - enable in the configuration (callback_whitelist or callbacks_enabled)
+options:
+  prometheus_file:
+    description: Path of the Prometheus textfile collector file (C(.prom)) written at the end of the playbook.
+    env:
+      - name: WFK_LATENCY_PROMETHEUS_FILE
+    ini:
+      - section: callback_wfk_latency
+        key: prometheus_file
+    type: path
+  json_file:
+    description: Path of the JSON report written at the end of the playbook.
+    env:
+      - name: WFK_LATENCY_JSON_FILE
+    ini:
+      - section: callback_wfk_latency
+        key: json_file
+    type: path
+  top:
+    description: Number of the slowest device, endpoint and module rows of the summary.
+    env:
+      - name: WFK_LATENCY_TOP
+    ini:
+      - section: callback_wfk_latency
+        key: top
+    default: 20
+    type: int
+'''
+
+import os
+import json
+import math
+import time
+import tempfile
+
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.plugins.callback import CallbackBase
+
+# le buckets of the Prometheus histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+METRIC = 'wfk_api_request_duration_seconds'
+
+
+def percentile(values, quantile):
+    # nearest-rank percentile of the sorted values
+    if not values:
+        return None
+
+    rank = max(1, int(math.ceil(quantile * len(values))))
+
+    return values[min(rank, len(values)) - 1]
+
+
+def device_name(device):
+    # 'host:port' of the device URL, the URL itself if it has no host
+    return urlsplit(device).netloc or device
+
+
+def label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'wfk_latency'
+    CALLBACK_NEEDS_WHITELIST = True
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        # latencies = {(device, 'METHOD path', module): [seconds, ...]}
+        self.latencies = dict()
+        # failures = {(device, 'METHOD path', module): count}
+        self.failures = dict()
+        self.tasks = 0
+        os.environ.setdefault('WFK_TRACE', '1')
+
+    def add_trace(self, module, trace):
+        device = device_name(trace.get('device', ''))
+        for request in trace.get('requests', list()):
+            key = (device, '%s %s' % (request['method'], request['path']),
+                   module)
+            self.latencies.setdefault(key, list()).append(request['elapsed'])
+            status_code = request.get('status_code')
+            if status_code is None or status_code >= 400:
+                self.failures[key] = self.failures.get(key, 0) + 1
+
+    def add_result(self, result):
+        module = result._task.action
+        module_result = result._result
+        traces = list()
+        if isinstance(module_result.get('trace'), dict):
+            traces.append(module_result['trace'])
+        # the devices of the hosts option
+        for device_result in (module_result.get('devices') or dict()).values():
+            if isinstance(device_result, dict) and \
+                    isinstance(device_result.get('trace'), dict):
+                traces.append(device_result['trace'])
+        # the items of a loop
+        for item_result in module_result.get('results') or list():
+            if isinstance(item_result, dict) and \
+                    isinstance(item_result.get('trace'), dict):
+                traces.append(item_result['trace'])
+
+        if traces:
+            self.tasks += 1
+        for trace in traces:
+            self.add_trace(module, trace)
+
+    def v2_runner_on_ok(self, result):
+        self.add_result(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.add_result(result)
+
+    def rows(self):
+        # [{device, endpoint, module, count, failed, sum, p50, p95, p99}]
+        rows = list()
+        for key in sorted(self.latencies.keys()):
+            values = sorted(self.latencies[key])
+            row = dict(device=key[0], endpoint=key[1], module=key[2],
+                       count=len(values), failed=self.failures.get(key, 0),
+                       sum=round(sum(values), 6))
+            for name, quantile in QUANTILES:
+                row[name] = percentile(values, quantile)
+            rows.append(row)
+
+        return rows
+
+    def group(self, index):
+        # {device or endpoint or module: {count, p50, p95, p99}}
+        groups = dict()
+        for key, values in self.latencies.items():
+            groups.setdefault(key[index], list()).extend(values)
+
+        result = dict()
+        for name, values in groups.items():
+            values.sort()
+            result[name] = dict(count=len(values))
+            for quantile_name, quantile in QUANTILES:
+                result[name][quantile_name] = percentile(values, quantile)
+
+        return result
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.latencies:
+            return
+
+        rows = self.rows()
+        self.print_summary(rows)
+
+        prometheus_file = self.get_option('prometheus_file')
+        if prometheus_file:
+            self.write_file(prometheus_file, self.prometheus_text())
+        json_file = self.get_option('json_file')
+        if json_file:
+            report = dict(time=time.time(), tasks=self.tasks, requests=rows,
+                          devices=self.group(0), endpoints=self.group(1),
+                          modules=self.group(2))
+            self.write_file(json_file, json.dumps(report, indent=2,
+                                                  sort_keys=True))
+
+    def print_summary(self, rows):
+        self._display.banner('WEBFRONT-K API LATENCY')
+        self._display.display('%d traced tasks, %d requests'
+                              % (self.tasks, sum([r['count'] for r in rows])))
+
+        line = '%-24s %-44s %-18s %7s %6s %9s %9s %9s'
+        self._display.display(line % ('DEVICE', 'ENDPOINT', 'MODULE', 'COUNT',
+                                      'FAILED', 'P50', 'P95', 'P99'))
+        rows = sorted(rows, key=lambda r: r['p95'], reverse=True)
+        for row in rows[:self.get_option('top')]:
+            self._display.display(line % (
+                row['device'][:24], row['endpoint'][:44], row['module'][:18],
+                row['count'], row['failed'], '%.4f' % row['p50'],
+                '%.4f' % row['p95'], '%.4f' % row['p99']))
+
+        self._display.display('')
+        for device, totals in sorted(self.group(0).items()):
+            self._display.display(
+                '%-24s %7d requests  p50 %.4f  p95 %.4f  p99 %.4f'
+                % (device[:24], totals['count'], totals['p50'],
+                   totals['p95'], totals['p99']))
+
+    def prometheus_text(self):
+        lines = ['# HELP %s Latency of the WEBFRONT-K REST API calls.'
+                 % METRIC,
+                 '# TYPE %s histogram' % METRIC]
+        quantile_lines = [
+            '# HELP %s_quantile Latency percentiles of the WEBFRONT-K REST '
+            'API calls of the last playbook.' % METRIC,
+            '# TYPE %s_quantile gauge' % METRIC]
+
+        for key in sorted(self.latencies.keys()):
+            values = sorted(self.latencies[key])
+            method, path = key[1].split(' ', 1)
+            labels = 'device="%s",method="%s",endpoint="%s",module="%s"' % (
+                label_value(key[0]), label_value(method), label_value(path),
+                label_value(key[2]))
+
+            count = 0
+            for bucket in BUCKETS:
+                while count < len(values) and values[count] <= bucket:
+                    count += 1
+                lines.append('%s_bucket{%s,le="%s"} %d'
+                             % (METRIC, labels, bucket, count))
+            lines.append('%s_bucket{%s,le="+Inf"} %d'
+                         % (METRIC, labels, len(values)))
+            lines.append('%s_sum{%s} %s'
+                         % (METRIC, labels, round(sum(values), 6)))
+            lines.append('%s_count{%s} %d' % (METRIC, labels, len(values)))
+
+            for name, quantile in QUANTILES:
+                quantile_lines.append('%s_quantile{%s,quantile="%s"} %s'
+                                      % (METRIC, labels, quantile,
+                                         percentile(values, quantile)))
+
+        return '\n'.join(lines + quantile_lines) + '\n'
+
+    def write_file(self, path, text):
+        # the textfile collector must never read a partial file
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            self._display.warning('wfk_latency: failed to write %s: %s'
+                                  % (path, e))
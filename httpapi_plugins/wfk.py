@@ -0,0 +1,117 @@
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+author: Seonil Kim(@sikim-piolink)
+httpapi: wfk
+short_description: HttpApi Plugin for the Piolink WEBFRONT-K
+description:
+  - This HttpApi plugin connects to the REST API of the WEBFRONT-K.
+  - The persistent connection keeps the keep-alive session, the authentication and
+    the application IDs of the WEBFRONT-K between the pio_* tasks of a host.
+version_added: '2.10'
+'''
+
+import time
+import json
+import base64
+try:
+    import requests
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.plugins.httpapi import HttpApiBase
+
+BASE_HEADERS = {'Content-Type': 'application/json'}
+
+
+class HttpApi(HttpApiBase):
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self.auth_header = None
+        self.session = None
+        # cache = {(kind, name): (value, stored time)}
+        self.cache = dict()
+
+    def login(self, username, password):
+        self.auth_header = "Basic %s" % to_text(base64.b64encode(to_bytes(
+            "%s:%s" % (username, password), errors='surrogate_or_strict')))
+        self.connection._auth = {'Authorization': self.auth_header}
+
+    def logout(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def handle_httperror(self, exc):
+        # 401 logs in again, the other errors are returned to the module
+        if exc.code == 401:
+            return super(HttpApi, self).handle_httperror(exc)
+
+        return exc
+
+    def send_request(self, method, path, data=None, timeout=None):
+        # returns (status code, response text) of the REST call, timeout is
+        # the (connect, read) timeout of the module
+        if not self.connection._connected:
+            self.connection._connect()
+
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+        if timeout is not None:
+            # a list once sent through the connection
+            timeout = tuple(timeout)
+
+        if HAS_REQUESTS:
+            if self.session is None:
+                self.session = requests.Session()
+            headers = dict(BASE_HEADERS, Authorization=self.auth_header)
+            # verify is given to every request, REQUESTS_CA_BUNDLE would
+            # override the one of the session
+            resp = self.session.request(
+                method, self.connection._url + path, headers=headers,
+                data=body, timeout=timeout,
+                verify=self.connection.get_option('validate_certs'))
+            return resp.status_code, resp.text
+
+        kwargs = dict()
+        if timeout is not None:
+            kwargs['timeout'] = max(timeout)
+        response, response_data = self.connection.send(
+            path, body, method=method, headers=BASE_HEADERS, **kwargs)
+
+        return response.getcode(), to_text(response_data.getvalue())
+
+    def get_device_url(self):
+        if not self.connection._connected:
+            self.connection._connect()
+
+        return self.connection._url
+
+    def cache_get_many(self, kind, names, ttl):
+        # {name: value} of the names cached and not expired
+        now = time.time()
+        values = dict()
+        for name in names:
+            entry = self.cache.get((kind, name))
+            if entry is not None and now - entry[1] <= ttl:
+                values[name] = entry[0]
+
+        return values
+
+    def cache_set_many(self, kind, values):
+        now = time.time()
+        for name, value in values.items():
+            self.cache[(kind, name)] = (value, now)
+
+    def cache_delete(self, kind, name):
+        self.cache.pop((kind, name), None)
@@ -19,32 +19,32 @@ description:
    - You can manage the WEBFRONT-K applications.
 version_added: '2.10'
 requirements:
-   - requests
+   - requests (optional, see I(transport))
 options:
   host:
     description:
       - Enter the IPv4 address of the WEBFRONT-K.
-    required: True
+      - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
     type: str
   port:
     description:
       - Enter the port number of the WEBFRONT-K.
-    required: True
+      - Not required when the task uses the C(httpapi) connection.
     type: str
   username:
     description:
       - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
-    required: True
+      - Not required when the task uses the C(httpapi) connection.
     type: str
   password:
     description:
       - Enter the user's password.
-    required: True
+      - Not required when the task uses the C(httpapi) connection.
     type: str
   app_name:
     description:
       - Enter the application name. "Application" means the applications provided by the WEBFRONT-K.
-    required: True
+      - One of I(app_name), I(apps) and I(app_file) is required.
     type: str
   app_ip_list:
     description:
@@ -68,6 +68,152 @@ options:
         description:
           - Enter the domain names of the WEBFRONT-K application.
         type: str
+  apps:
+    description:
+      - Enter the list of the applications to configure in one task, instead of I(app_name).
+      - The application list of the WEBFRONT-K is read once, the missing applications are created
+        and the IP and domain lists of up to I(workers) applications are configured concurrently.
+      - The result of each application written is returned in C(apps).
+    type: list
+    elements: dict
+    suboptions:
+      app_name:
+        description:
+          - Enter the application name.
+        required: True
+        type: str
+      app_ip_list:
+        description:
+          - Enter the lists of IP addresses of the application, like I(app_ip_list).
+        type: list
+        elements: dict
+      app_domain_list:
+        description:
+          - Enter the lists of the domain names of the application, like I(app_domain_list).
+        type: list
+        elements: dict
+  app_file:
+    description:
+      - Enter the path of a JSON array, JSON lines (C(.jsonl)) or YAML list file of the applications,
+        with the entries of I(apps), instead of I(app_name).
+    type: path
+  state:
+    description:
+      - C(present) adds the IP addresses and domain names missing from the application and
+        updates the port of its IP addresses.
+      - C(exact) also deletes the IP addresses and domain names of the application that are not
+        in I(app_ip_list) or I(app_domain_list), an empty list deletes all of them and a list
+        that is not given is not changed.
+    default: present
+    choices: ['present', 'exact']
+    type: str
+  workers:
+    description:
+      - Maximum number of groups of writes sent concurrently.
+    default: 10
+    type: int
+  batch_size:
+    description:
+      - Maximum number of writes of an application sent in order by one worker, the writes
+        of an application are split in groups of I(batch_size) sent concurrently.
+    default: 100
+    type: int
+  pool_size:
+    description:
+      - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+    default: 10
+    type: int
+  keepalive:
+    description:
+      - Reuse the connections to the WEBFRONT-K between REST calls.
+    default: True
+    type: bool
+  max_retries:
+    description:
+      - Number of times a GET, PUT or DELETE request is sent again after a connection error, a timeout
+        or a C(429) or C(5xx) status of the WEBFRONT-K.
+    default: 0
+    type: int
+  app_cache_ttl:
+    description:
+      - Seconds the application ID resolved from C(app_name) is cached on the controller.
+      - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+      - 0 disables the cache.
+    default: 300
+    type: int
+  cache_dir:
+    description:
+      - Directory of the controller-side cache files.
+    default: ~/.ansible/tmp/wfk_cache
+    type: path
+  hosts:
+    description:
+      - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+      - C(port) is used for the devices without a port.
+      - The result of each device is returned in C(devices).
+    type: list
+    elements: str
+  max_parallel:
+    description:
+      - Maximum number of devices of I(hosts) configured concurrently.
+    default: 10
+    type: int
+  transport:
+    description:
+      - Backend sending the REST calls to the WEBFRONT-K.
+      - C(requests) pools the connections with requests sessions.
+      - C(urls) uses the C(ansible.module_utils.urls) code shipped with Ansible and keeps up to
+        I(pool_size) idle connections per device, it needs no package on the managed node and
+        starts faster.
+      - C(asyncio) sends the requests of all the threads and devices from one event loop,
+        with at most I(pool_size) connections per device and I(max_concurrency) requests in flight.
+      - Defaults to C(requests) when it is installed, C(urls) otherwise.
+    choices: ['requests', 'urls', 'asyncio']
+    type: str
+  max_concurrency:
+    description:
+      - Maximum number of requests in flight to all the devices with I(transport=asyncio).
+    default: 100
+    type: int
+  retry_backoff:
+    description:
+      - Base seconds of the exponential backoff between the retries of I(max_retries).
+      - The delay is random between 0 and I(retry_backoff) * 2 ** retry, up to 30 seconds,
+        or the C(Retry-After) seconds of the WEBFRONT-K.
+    default: 0.5
+    type: float
+  connect_timeout:
+    description:
+      - Seconds to wait for the connection to the WEBFRONT-K.
+    default: 10
+    type: float
+  read_timeout:
+    description:
+      - Seconds to wait for the response of the WEBFRONT-K.
+    default: 60
+    type: float
+  rate_limit:
+    description:
+      - Maximum number of requests per second sent to each WEBFRONT-K, 0 for no limit.
+      - The requests of all the threads of the module run to a device share the limit.
+    default: 0
+    type: float
+  trace:
+    description:
+      - Return every REST call of the run in C(trace), with its method, path template, status code,
+        bytes sent and received, elapsed seconds and whether the connection was reused,
+        and the totals of the C(app_id) resolution, C(read) and C(write) phases.
+      - The C(WFK_TRACE=1) environment variable enables it for all the tasks.
+    default: False
+    type: bool
+  plan_file:
+    description:
+      - File of the plan of the writes to the WEBFRONT-K.
+      - In check mode, the device is read and the plan returned in C(plan) is saved in this file.
+      - Otherwise the saved plan is applied without reading the device again, the task fails
+        if the file has no plan of the device or it was planned with other options.
+      - The file keeps one plan per device, the devices of I(hosts) share it.
+    type: path
 author: Seonil Kim(@sikim-piolink)
 '''
 
@@ -93,18 +239,73 @@ EXAMPLES = r'''
             app_domain_list:
                 - app_domain: 1.1.1.1
                 - app_domain: 2.2.2.2
+
+      - name: Set the Config of several Apps
+        pio_app:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            apps:
+                - app_name: ansible_test1
+                  app_ip_list:
+                      - app_ip: 1.1.1.1
+                        app_port: 80
+                - app_name: ansible_test2
+                  app_domain_list:
+                      - app_domain: www.example.com
+            workers: 20
+
+      - name: Set the Config of the Apps of a file
+        pio_app:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            app_file: /tmp/apps.json
+
+      - name: Set the exact IP list of an App
+        pio_app:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            app_name: ansible_test
+            app_ip_list:
+                - app_ip: 1.1.1.1
+                  app_port: 80
+            state: exact
 ...
 '''
 
 RETURN = r'''
-#
+apps:
+    description: Number of writes, changed, failed and message of each application written with I(apps) or I(app_file).
+    returned: when I(apps) or I(app_file) is used and writes are sent
+    type: dict
+plan:
+    description: Writes planned from the state of the device, in the order they are sent, with their method, path relative to C(/api/v2) and body.
+    returned: in check mode
+    type: list
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
 '''
 
+from collections import OrderedDict
+
 from ansible.module_utils.basic import AnsibleModule
-#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils
-from ansible.module_utils.prest_utils import PrestUtils
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils, \
+#    prest_argument_spec, plan_argument_spec, device_options, run_devices, DEFAULT_WORKERS
+from ansible.module_utils.prest_utils import PrestUtils, prest_argument_spec, \
+    plan_argument_spec, device_options, run_devices, DEFAULT_WORKERS
 #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_APP_TYPE
 from ansible.module_utils.prest_module import CMD_APP_TYPE
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_stream import iter_file_entries
+from ansible.module_utils.prest_stream import iter_file_entries
+
+DEFAULT_BATCH_SIZE = 100
 
 app_ip_entry = dict(
     app_ip=dict(type='str'),
@@ -115,16 +316,29 @@ app_domain_entry = dict(
     app_domain=dict(type='str'),
 )
 
-module_args = dict(
-    host=dict(type='str', required=True),
-    port=dict(type='str', required=True),
-    username=dict(type='str', required=True),
-    password=dict(type='str', required=True, no_log=True),
+app_entry = dict(
     app_name=dict(type='str', required=True),
     app_ip_list=dict(type='list', elements='dict', options=app_ip_entry),
     app_domain_list=dict(type='list', elements='dict', options=app_domain_entry),
 )
 
+module_args = dict(
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
+    app_name=dict(type='str'),
+    app_ip_list=dict(type='list', elements='dict', options=app_ip_entry),
+    app_domain_list=dict(type='list', elements='dict', options=app_domain_entry),
+    apps=dict(type='list', elements='dict', options=app_entry),
+    app_file=dict(type='path'),
+    state=dict(type='str', default='present', choices=['present', 'exact']),
+    workers=dict(type='int', default=DEFAULT_WORKERS),
+    batch_size=dict(type='int', default=DEFAULT_BATCH_SIZE),
+)
+module_args.update(prest_argument_spec)
+module_args.update(plan_argument_spec)
+
 
 class PioApp(PrestUtils):
     def __init__(self, module):
@@ -137,43 +351,175 @@ class PioApp(PrestUtils):
             self.module.fail_json(msg="Invalid APP_Port: %s(range: 1~65535)"
                                   % app_ip_entry['app_port'])
 
-    def set_app_iplist(self, app_id):
-        url = self.set_url(CMD_APP_TYPE, 'app-gen', 'ip-list', app_id, None)
+    def get_apps(self):
+        # [{app_name, app_ip_list, app_domain_list}, ...] of the task
+        if self.module.params['app_name'] is not None:
+            params = self.module.params
+            apps = [dict(app_name=params['app_name'],
+                         app_ip_list=params['app_ip_list'],
+                         app_domain_list=params['app_domain_list'])]
+        elif self.module.params['apps'] is not None:
+            apps = self.module.params['apps']
+        else:
+            apps = self.read_app_file()
 
-        for ip_entry in self.module.params['app_ip_list']:
-            self.validate_ip_port(ip_entry)
-            app_ip = self.get_entry(url, 'ip', ip_entry['app_ip'],
-                                    'ip_list', 'ip_entry')
-            if app_ip is not None:
-                if app_ip['port'] == ip_entry['app_port']:
-                    continue
+        app_names = set()
+        for app in apps:
+            if app['app_name'] in app_names:
+                self.module.fail_json(msg="Duplicate app_name: %s"
+                                      % app['app_name'])
+            app_names.add(app['app_name'])
+            for ip_entry in app['app_ip_list'] or list():
+                self.validate_ip_port(ip_entry)
 
-            body = {'ip': ip_entry['app_ip'], 'port': ip_entry['app_port']}
-            self.resp = self.post(url, body)
+        return apps
 
-    def set_app_domainlist(self, app_id):
-        url = self.set_url(CMD_APP_TYPE, 'app-gen', 'domain-list',
-                           app_id, None)
-        for domain_entry in self.module.params['app_domain_list']:
-            app_domain = self.get_entry(url, 'domain', domain_entry['app_domain'],
-                                        'domain_list', 'domain_entry')
-            if app_domain is not None:
-                continue
+    def read_app_file(self):
+        # the entries of app_file, with the values as strings like the
+        # entries of apps, a list missing from an entry stays None
+        apps = list()
+        try:
+            for entry in iter_file_entries(self.module.params['app_file']):
+                if not isinstance(entry, dict) or not entry.get('app_name'):
+                    self.module.fail_json(msg="Invalid application entry: %s"
+                                          % entry)
+                app = dict(app_name=str(entry['app_name']), app_ip_list=None,
+                           app_domain_list=None)
+                if entry.get('app_ip_list') is not None:
+                    app['app_ip_list'] = [
+                        dict(app_ip=str(ip_entry['app_ip']),
+                             app_port=str(ip_entry['app_port']))
+                        for ip_entry in entry['app_ip_list']]
+                if entry.get('app_domain_list') is not None:
+                    app['app_domain_list'] = [
+                        dict(app_domain=str(domain_entry['app_domain']))
+                        for domain_entry in entry['app_domain_list']]
+                apps.append(app)
+        except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+            self.module.fail_json(msg="Failed to read the app_file: %s" % e)
 
-            body = {'domain': domain_entry['app_domain']}
-            self.resp = self.post(url, body)
+        return apps
 
-    def run(self):
-        if self.module.check_mode:
-            return self.result
+    def app_urls(self, app_id):
+        # (ip-list URL, domain-list URL) of the application
+        return (self.set_url(CMD_APP_TYPE, 'app-gen', 'ip-list', app_id, None),
+                self.set_url(CMD_APP_TYPE, 'app-gen', 'domain-list', app_id,
+                             None))
+
+    def read_app_lists(self, app, app_id):
+        # the lists of the task are read once, the others are not changed
+        ip_url, domain_url = self.app_urls(app_id)
+        if app['app_ip_list'] is not None:
+            self.get_index(ip_url, 'ip', 'ip_list', 'ip_entry')
+        if app['app_domain_list'] is not None:
+            self.get_index(domain_url, 'domain', 'domain_list',
+                           'domain_entry')
+
+    def plan_app_iplist(self, app, app_id):
+        # [(method, url, body), ...] of the IP list, with state exact the
+        # entries missing from app_ip_list are deleted
+        if app['app_ip_list'] is None:
+            return list()
+
+        url = self.app_urls(app_id)[0]
+        ip_index = self.get_index(url, 'ip', 'ip_list', 'ip_entry')
+        # ports = {app_ip: app_port}, the last entry wins
+        ports = OrderedDict((ip_entry['app_ip'], ip_entry['app_port'])
+                            for ip_entry in app['app_ip_list'])
+
+        writes = list()
+        for app_ip, app_port in ports.items():
+            app_ip_entry = ip_index.get(app_ip)
+            if app_ip_entry is None or str(app_ip_entry['port']) != app_port:
+                writes.append(('POST', url, {'ip': app_ip, 'port': app_port}))
+        if self.module.params['state'] == 'exact':
+            writes.extend(('DELETE', url, {'ip': app_ip})
+                          for app_ip in ip_index if app_ip not in ports)
+
+        return writes
+
+    def plan_app_domainlist(self, app, app_id):
+        # [(method, url, body), ...] of the domain list
+        if app['app_domain_list'] is None:
+            return list()
+
+        url = self.app_urls(app_id)[1]
+        domain_index = self.get_index(url, 'domain', 'domain_list',
+                                      'domain_entry')
+        domains = OrderedDict((domain_entry['app_domain'], True)
+                              for domain_entry in app['app_domain_list'])
+
+        writes = [('POST', url, {'domain': app_domain})
+                  for app_domain in domains if app_domain not in domain_index]
+        if self.module.params['state'] == 'exact':
+            writes.extend(('DELETE', url, {'domain': app_domain})
+                          for app_domain in domain_index
+                          if app_domain not in domains)
 
-        app_id = self.get_app_id()
-        self.set_app_iplist(app_id)
-        self.set_app_domainlist(app_id)
+        return writes
+
+    def add_app_steps(self, app_name, writes):
+        # the writes of an application are independent, they are sent
+        # concurrently in groups of batch_size
+        batch_size = self.module.params['batch_size']
+        for idx in range(0, len(writes)):
+            method, url, body = writes[idx]
+            self.add_step(method, url, body,
+                          '%s/%d' % (app_name, idx // batch_size),
+                          app_name=app_name)
+
+    def plan(self):
+        apps = self.get_apps()
+        # one app-list fetch for all the applications, the lists of the
+        # existing ones are read concurrently
+        app_ids = self.get_app_ids([app['app_name'] for app in apps],
+                                   create=False)
+        self.run_parallel(lambda app: self.read_app_lists(
+            app, app_ids[app['app_name']]), apps, self.module.params['workers'])
+
+        for app in apps:
+            app_id = app_ids[app['app_name']]
+            self.add_app_steps(app['app_name'],
+                               self.plan_app_iplist(app, app_id) +
+                               self.plan_app_domainlist(app, app_id))
+
+    def apply_plan(self):
+        if not self.steps:
+            return super(PioApp, self).apply_plan()
+
+        step_results = self.apply_steps(self.steps)
+        self.aggregate_result([step_result for step, step_result
+                               in step_results])
+        if self.module.params['app_name'] is not None:
+            return
+
+        # apps = {app_name: result} of the applications written
+        apps = dict()
+        for step, step_result in step_results:
+            app_result = apps.setdefault(step['app_name'], dict(
+                writes=0, changed=False, failed=False, message=''))
+            app_result['writes'] += 1
+            app_result['changed'] |= step_result['changed']
+            app_result['failed'] |= step_result['failed']
+            if step_result['failed'] or not app_result['message']:
+                app_result['message'] = step_result['message']
+        self.result['apps'] = apps
+
+    def run(self):
+        self.run_plan()
 
 
 def main():
-    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options,
+                                               ['app_name', 'apps',
+                                                'app_file']],
+                           required_one_of=[['app_name', 'apps',
+                                             'app_file']],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioApp, module)
+
     app = PioApp(module)
     app.init_args()
     app.run()
@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = r'''
+---
+module: pio_facts
+short_description: Gathering the WEBFRONT-K Configuration as Facts
+description:
+   - You can read the configuration of the WEBFRONT-K into Ansible facts, without changing it.
+   - The application list is read once, then the IP and domain lists and the request inspection
+     status of the applications and the signature classes are read concurrently.
+   - The facts are returned in C(ansible_facts.wfk), or in C(ansible_facts.wfk_devices) keyed by
+     device with I(hosts), so a fact cache (C(jsonfile), C(redis)) serves them to later tasks and runs.
+   - A read answered with an HTTP error, after I(max_retries), fails the task instead of leaving the fact empty.
+version_added: '2.10'
+requirements:
+    - requests (optional, see I(transport))
+options:
+   host:
+     description:
+       - Enter the IPv4 address of the WEBFRONT-K.
+       - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
+     type: str
+   port:
+     description:
+       - Enter the port number of the WEBFRONT-K.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   username:
+     description:
+       - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   password:
+     description:
+       - Enter the user's password.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   gather_subset:
+     description:
+       - Parts of the configuration to read, C(all) or a list of C(apps), C(ip_lists), C(domain_lists),
+         C(req_status) and C(sig_classes).
+       - A part preceded by C(!) is not read, e.g. C(!sig_classes). With only such parts, the other
+         parts are read.
+       - C(apps) is the application list, the application list is also read for C(ip_lists),
+         C(domain_lists) and C(req_status).
+     default: ['all']
+     type: list
+     elements: str
+   app_pattern:
+     description:
+       - Shell-style pattern of the names of the applications to read, all of them by default.
+     type: str
+   workers:
+     description:
+       - Maximum number of requests sent concurrently.
+     default: 10
+     type: int
+   pool_size:
+     description:
+       - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+     default: 10
+     type: int
+   keepalive:
+     description:
+       - Reuse the connections to the WEBFRONT-K between REST calls.
+     default: True
+     type: bool
+   max_retries:
+     description:
+       - Number of times a failed connection to the WEBFRONT-K is retried.
+     default: 0
+     type: int
+   app_cache_ttl:
+     description:
+       - Seconds the application ID resolved from C(app_name) is cached on the controller.
+       - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+       - 0 disables the cache.
+     default: 300
+     type: int
+   cache_dir:
+     description:
+       - Directory of the controller-side cache files.
+     default: ~/.ansible/tmp/wfk_cache
+     type: path
+   hosts:
+     description:
+       - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+       - C(port) is used for the devices without a port.
+       - The result of each device is returned in C(devices).
+     type: list
+     elements: str
+   max_parallel:
+     description:
+       - Maximum number of devices of I(hosts) configured concurrently.
+     default: 10
+     type: int
+author: Seonil Kim(@sikim-piolink)
+'''
+
+EXAMPLES = r'''
+---
+- name: WEBFRONT-K Facts
+  hosts: localhost
+  collections:
+      - sikim_piolink.wfktest
+  tasks:
+      - name: Gather the applications and their IP lists
+        pio_facts:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            gather_subset:
+                - apps
+                - ip_lists
+            workers: 20
+
+      - name: Show the IP list of an application
+        debug:
+            var: ansible_facts.wfk.apps.ansible_test.ip_list
+...
+'''
+
+RETURN = r'''
+ansible_facts:
+    description: C(wfk) with the C(device), the C(gather_subset) read, C(apps) (C(app_id), C(ip_list),
+      C(domain_list) and C(req_status) of each application) and C(sig_classes) (number of signatures,
+      of user-defined signatures and of signatures of each status of each signature class).
+      With I(hosts), C(wfk_devices) with the C(wfk) facts of each device.
+    returned: always
+    type: dict
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import prest_argument_spec, \
+#    device_options, run_devices, DEFAULT_WORKERS
+from ansible.module_utils.prest_utils import prest_argument_spec, \
+    device_options, run_devices, DEFAULT_WORKERS
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_SITE_TYPE, \
+#    CMD_APP_TYPE, PrestStreamResponse
+from ansible.module_utils.prest_module import CMD_SITE_TYPE, CMD_APP_TYPE, \
+    PrestStreamResponse
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_req import PrestReq, \
+#    req_type_dict
+from ansible.module_utils.prest_req import PrestReq, req_type_dict
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_catalog import sig_class_dict
+from ansible.module_utils.prest_catalog import sig_class_dict
+
+fact_subsets = ['apps', 'ip_lists', 'domain_lists', 'req_status',
+                'sig_classes']
+
+module_args = dict(
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
+    gather_subset=dict(type='list', elements='str', default=['all']),
+    app_pattern=dict(type='str'),
+    workers=dict(type='int', default=DEFAULT_WORKERS),
+)
+module_args.update(prest_argument_spec)
+
+
+class PioFacts(PrestReq):
+    def __init__(self, module):
+        super(PioFacts, self).__init__(module)
+        # facts = {'device', 'gather_subset', 'apps', 'sig_classes'}
+        self.facts = dict()
+
+    def get_subsets(self):
+        # the fact_subsets of gather_subset
+        subsets = set()
+        excluded = set()
+        for name in self.module.params['gather_subset']:
+            subset = name[1:] if name.startswith('!') else name
+            if subset == 'all':
+                names = fact_subsets
+            elif subset in fact_subsets:
+                names = [subset]
+            else:
+                self.module.fail_json(msg="Invalid gather_subset: %s, "
+                                      "expected all or one of %s"
+                                      % (name, ', '.join(fact_subsets)))
+            if name.startswith('!'):
+                excluded.update(names)
+            else:
+                subsets.update(names)
+
+        if not subsets:
+            subsets = set(fact_subsets)
+
+        return [subset for subset in fact_subsets
+                if subset in subsets and subset not in excluded]
+
+    def request(self, method, url, data=None, headers=None, stream=False):
+        # a failed read would leave an empty fact, e.g. xss: null on a 503,
+        # so the task fails instead
+        resp = super(PioFacts, self).request(method, url, data, headers,
+                                             stream)
+        if resp.status_code >= 400:
+            if isinstance(resp, PrestStreamResponse):
+                resp.close()
+            self.fail_request('%s %s failed: HTTP %d'
+                              % (method, url, resp.status_code),
+                              status_code=resp.status_code)
+
+        return resp
+
+    def read_app_list(self, app):
+        # (list name, [entry, ...]) of the ip-list or domain-list
+        app_id, list_type = app
+        list_name = list_type.replace('-', '_')
+        entry_name = list_type.split('-')[0] + '_entry'
+        url = self.set_url(CMD_APP_TYPE, 'app-gen', list_type, app_id, None)
+
+        return list_name, self.get_entries(url, list_name, entry_name)
+
+    def read_sig_class(self, sig_class):
+        # {'count', 'user_defined', 'status': {sig_status: count}}
+        url = self.set_url(CMD_SITE_TYPE, 'paf_sig_base', sig_class, None,
+                           None)
+        summary = dict(count=0, user_defined=0, status=dict())
+        # the signatures are counted as they are read, not kept in memory
+        for entry in self.iter_entries(url, sig_class, 'sig_entry'):
+            summary['count'] += 1
+            if entry.get('user_define'):
+                summary['user_defined'] += 1
+            sig_status = str(entry.get('sig_status'))
+            summary['status'][sig_status] = \
+                summary['status'].get(sig_status, 0) + 1
+
+        return summary
+
+    def read(self, job):
+        # runs one read in the worker threads, job = (kind, key)
+        kind, key = job
+        if kind == 'list':
+            return self.read_app_list(key)
+        if kind == 'req_status':
+            app_id, req_name = key
+            return self.get_req_status(app_id, req_name)
+
+        return self.read_sig_class(key)
+
+    def gather(self, subsets):
+        jobs = list()
+
+        apps = dict()
+        if set(subsets) & set(['apps', 'ip_lists', 'domain_lists',
+                               'req_status']):
+            app_ids = self.get_app_ids(app_pattern=self.module.params[
+                'app_pattern'] or '*')
+            for app_name, app_id in app_ids.items():
+                apps[app_name] = dict(app_id=app_id)
+                if 'ip_lists' in subsets:
+                    jobs.append(('list', (app_id, 'ip-list')))
+                if 'domain_lists' in subsets:
+                    jobs.append(('list', (app_id, 'domain-list')))
+                if 'req_status' in subsets:
+                    jobs.extend(('req_status', (app_id, req_name))
+                                for req_name in sorted(req_type_dict.keys()))
+            self.facts['apps'] = apps
+
+        if 'sig_classes' in subsets:
+            jobs.extend(('sig_class', sig_class)
+                        for sig_class in sorted(sig_class_dict.values()))
+
+        # app_names = {app_id: app_name}
+        app_names = dict((app['app_id'], app_name)
+                         for app_name, app in apps.items())
+        sig_classes = dict()
+        for job, value in zip(jobs, self.run_parallel(
+                self.read, jobs, self.module.params['workers'])):
+            kind, key = job
+            if kind == 'sig_class':
+                sig_classes[key] = value
+                continue
+
+            app = apps[app_names[key[0]]]
+            if kind == 'list':
+                list_name, entries = value
+                if list_name == 'ip_list':
+                    app['ip_list'] = [dict(ip=entry.get('ip'),
+                                           port=entry.get('port'))
+                                      for entry in entries]
+                else:
+                    app['domain_list'] = [entry.get('domain')
+                                          for entry in entries]
+            else:
+                app.setdefault('req_status', dict())[key[1]] = value
+
+        if 'sig_classes' in subsets:
+            self.facts['sig_classes'] = sig_classes
+
+    def run(self):
+        # read-only, the result is the facts
+        self.aggregated = True
+        self.result['changed'] = False
+
+        subsets = self.get_subsets()
+        self.facts.update(device=self.get_device(), gather_subset=subsets)
+        self.gather(subsets)
+
+        self.result['ansible_facts'] = dict(wfk=self.facts)
+        self.result['message'] = '%d applications, %d signature classes' % (
+            len(self.facts.get('apps', dict())),
+            len(self.facts.get('sig_classes', dict())))
+
+
+def main():
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioFacts, module)
+
+    facts = PioFacts(module)
+    facts.init_args()
+    facts.run()
+    facts.set_result()
+
+
+if __name__ == '__main__':
+    main()
@@ -19,33 +19,49 @@ description:
    - You can manage Blocking Web Attck Programs of the WEBFRONT-K.
 version_added: '2.10'
 requirements:
-   - requests
+   - requests (optional, see I(transport))
 options:
    host:
      description:
        - Enter the IPv4 address of the WEBFRONT-K.
-     required: True
+       - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
      type: str
    port:
      description:
        - Enter the port number of the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
      type: str
    username:
      description:
        - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
      type: str
    password:
      description:
          - Enter the user's password.
-            required: True
+         - Not required when the task uses the C(httpapi) connection.
      type: str
    app_name:
      description:
        - Enter the application name. "Application" means the applications provided by the WEBFRONT-K.
-     required: True
+       - One of I(app_name), I(app_names) and I(app_pattern) is required.
+     type: str
+   app_names:
+     description:
+       - Enter the list of the application names to configure at once.
+     type: list
+     elements: str
+   app_pattern:
+     description:
+       - Enter a shell-style wildcard pattern (e.g. C(web-*)) of the application names to configure at once.
      type: str
+   workers:
+     description:
+       - Maximum number of applications configured concurrently with I(app_names) or I(app_pattern).
+       - Not used with C(transport=asyncio), the applications are then configured by coroutines capped by
+         I(pool_size) and I(max_concurrency).
+     default: 10
+     type: int
    status:
      description:
        - Enter one of the following numbers to configure the state of Blocking Web Attack Programs.
@@ -73,6 +89,94 @@ options:
      default: 0
      choices: [0, 1]
      type: int
+   pool_size:
+     description:
+       - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+     default: 10
+     type: int
+   keepalive:
+     description:
+       - Reuse the connections to the WEBFRONT-K between REST calls.
+     default: True
+     type: bool
+   max_retries:
+     description:
+       - Number of times a GET, PUT or DELETE request is sent again after a connection error, a timeout
+         or a C(429) or C(5xx) status of the WEBFRONT-K.
+     default: 0
+     type: int
+   app_cache_ttl:
+     description:
+       - Seconds the application ID resolved from C(app_name) is cached on the controller.
+       - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+       - 0 disables the cache.
+     default: 300
+     type: int
+   cache_dir:
+     description:
+       - Directory of the controller-side cache files.
+     default: ~/.ansible/tmp/wfk_cache
+     type: path
+   hosts:
+     description:
+       - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+       - C(port) is used for the devices without a port.
+       - The result of each device is returned in C(devices).
+     type: list
+     elements: str
+   max_parallel:
+     description:
+       - Maximum number of devices of I(hosts) configured concurrently.
+     default: 10
+     type: int
+   transport:
+     description:
+       - Backend sending the REST calls to the WEBFRONT-K.
+       - C(requests) pools the connections with requests sessions.
+       - C(urls) uses the C(ansible.module_utils.urls) code shipped with Ansible and keeps up to
+         I(pool_size) idle connections per device, it needs no package on the managed node and
+         starts faster.
+       - C(asyncio) sends the requests of all the threads and devices from one event loop,
+         with at most I(pool_size) connections per device and I(max_concurrency) requests in flight.
+       - Defaults to C(requests) when it is installed, C(urls) otherwise.
+     choices: ['requests', 'urls', 'asyncio']
+     type: str
+   max_concurrency:
+     description:
+       - Maximum number of requests in flight to all the devices with I(transport=asyncio).
+     default: 100
+     type: int
+   retry_backoff:
+     description:
+       - Base seconds of the exponential backoff between the retries of I(max_retries).
+       - The delay is random between 0 and I(retry_backoff) * 2 ** retry, up to 30 seconds,
+         or the C(Retry-After) seconds of the WEBFRONT-K.
+     default: 0.5
+     type: float
+   connect_timeout:
+     description:
+       - Seconds to wait for the connection to the WEBFRONT-K.
+     default: 10
+     type: float
+   read_timeout:
+     description:
+       - Seconds to wait for the response of the WEBFRONT-K.
+     default: 60
+     type: float
+   rate_limit:
+     description:
+       - Maximum number of requests per second sent to each WEBFRONT-K, 0 for no limit.
+       - The requests of all the threads of the module run to a device share the limit.
+     default: 0
+     type: float
+   trace:
+     description:
+       - Return every REST call of the run in C(trace), with its method, path template, status code,
+         bytes sent and received, elapsed seconds and whether the connection was reused,
+         and the totals of the C(app_id) resolution, C(read) and C(write) phases.
+       - The C(WFK_TRACE=1) environment variable enables it for all the tasks.
+     default: False
+     type: bool
 author: Seonil Kim(@sikim-piolink)
 '''
 
@@ -93,53 +197,78 @@ EXAMPLES = r'''
             status: 1
             block: 0
             log: 0
+      - name: Set Req tool Config of the web applications
+        pio_req_tool:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            app_pattern: "web-*"
+            workers: 20
+            status: 1
+            block: 1
+            log: 1
 ...
 '''
 
 RETURN = r'''
-#
+before:
+    description: State of the request inspection before the task, as C(enable), C(block) and C(log).
+    returned: when I(app_name) is used
+    type: dict
+after:
+    description: State of the request inspection after the task.
+    returned: when I(app_name) is used
+    type: dict
+apps:
+    description: Result of each application of I(app_names) or I(app_pattern), with the C(before) and C(after) states.
+    returned: when I(app_names) or I(app_pattern) is used
+    type: dict
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils
-from ansible.module_utils.prest_utils import PrestUtils
-#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_APP_TYPE
-from ansible.module_utils.prest_module import CMD_APP_TYPE
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import prest_argument_spec, \
+#    device_options, run_devices, DEFAULT_WORKERS
+from ansible.module_utils.prest_utils import prest_argument_spec, \
+    device_options, run_devices, DEFAULT_WORKERS
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_req import PrestReq, \
+#    req_app_options
+from ansible.module_utils.prest_req import PrestReq, req_app_options
 
 module_args = dict(
-    host=dict(type='str', required=True),
-    port=dict(type='str', required=True),
-    username=dict(type='str', required=True),
-    password=dict(type='str', required=True, no_log=True),
-    app_name=dict(type='str', required=True),
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
+    app_name=dict(type='str'),
+    app_names=dict(type='list', elements='str'),
+    app_pattern=dict(type='str'),
+    workers=dict(type='int', default=DEFAULT_WORKERS),
     status=dict(type='int', required=True, choices=[0, 1]),
     block=dict(type='int', required=True, choices=[0, 1]),
     log=dict(type='int', required=True, choices=[0, 1]),
 )
+module_args.update(prest_argument_spec)
 
 
-class PioReqTool(PrestUtils):
+class PioReqTool(PrestReq):
     def __init__(self, module):
-        super(PioReqTool, self).__init__(module)
-
-    def set_req_tool_status(self, app_id):
-        url = self.set_url(CMD_APP_TYPE, 'req-tool', 'status', app_id, None)
-        status = self.module.params['status']
-        block = self.module.params['block']
-        log = self.module.params['log']
-        body = {'enable': status, 'block': block, 'log': log}
-        self.resp = self.put(url, body)
-
-    def run(self):
-        if self.module.check_mode:
-            return self.result
-
-        app_id = self.get_app_id()
-        self.set_req_tool_status(app_id)
+        super(PioReqTool, self).__init__(module, 'tool')
 
 
 def main():
-    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options,
+                                               req_app_options],
+                           required_one_of=[req_app_options],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioReqTool, module)
+
     req_tool = PioReqTool(module)
     req_tool.init_args()
     req_tool.run()
@@ -0,0 +1,357 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = r'''
+---
+module: pio_sig_catalog
+short_description: Mirroring the Signature Catalog
+description:
+   - You can keep a local copy of the signature catalog of the WEBFRONT-K.
+   - The signature classes are downloaded concurrently into a SQLite file on the controller,
+     indexed by signature ID, signature class and signature content.
+   - Other modules and tasks look up the signatures in the file without calling the WEBFRONT-K.
+   - Only the signature classes that changed since the last run are rewritten.
+version_added: '2.10'
+requirements:
+    - requests (optional, see I(transport))
+options:
+   host:
+     description:
+       - Enter the IPv4 address of the WEBFRONT-K.
+       - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
+     type: str
+   port:
+     description:
+       - Enter the port number of the WEBFRONT-K.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   username:
+     description:
+       - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   password:
+     description:
+       - Enter the user's password.
+       - Not required when the task uses the C(httpapi) connection.
+     type: str
+   sig_classes:
+     description:
+       - Enter the signature classes to download, such as C(sig_req_sql).
+       - All the signature classes are downloaded by default.
+     type: list
+     elements: str
+   firmware:
+     description:
+       - Enter the firmware version of the WEBFRONT-K.
+       - One catalog file is kept per device and firmware version, so an upgraded device gets a new catalog.
+     default: default
+     type: str
+   max_age:
+     description:
+       - Seconds a downloaded signature class is used without asking the WEBFRONT-K again.
+       - 0 always checks the WEBFRONT-K, unchanged signature classes are still not rewritten.
+     default: 0
+     type: int
+   sig_ids:
+     description:
+       - Enter signature IDs to look up in the catalog once it is refreshed.
+       - The entries found are returned in C(signatures).
+     type: list
+     elements: str
+   workers:
+     description:
+       - Maximum number of signature classes downloaded concurrently.
+     default: 12
+     type: int
+   pool_size:
+     description:
+       - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+     default: 10
+     type: int
+   keepalive:
+     description:
+       - Reuse the connections to the WEBFRONT-K between REST calls.
+     default: True
+     type: bool
+   max_retries:
+     description:
+       - Number of times a GET, PUT or DELETE request is sent again after a connection error, a timeout
+         or a C(429) or C(5xx) status of the WEBFRONT-K.
+     default: 0
+     type: int
+   app_cache_ttl:
+     description:
+       - Seconds the application ID resolved from C(app_name) is cached on the controller.
+       - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+       - 0 disables the cache.
+     default: 300
+     type: int
+   cache_dir:
+     description:
+       - Directory of the controller-side cache files.
+     default: ~/.ansible/tmp/wfk_cache
+     type: path
+   hosts:
+     description:
+       - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+       - C(port) is used for the devices without a port.
+       - The result of each device is returned in C(devices).
+     type: list
+     elements: str
+   max_parallel:
+     description:
+       - Maximum number of devices of I(hosts) configured concurrently.
+     default: 10
+     type: int
+   transport:
+     description:
+       - Backend sending the REST calls to the WEBFRONT-K.
+       - C(requests) pools the connections with requests sessions.
+       - C(urls) uses the C(ansible.module_utils.urls) code shipped with Ansible and keeps up to
+         I(pool_size) idle connections per device, it needs no package on the managed node and
+         starts faster.
+       - C(asyncio) sends the requests of all the threads and devices from one event loop,
+         with at most I(pool_size) connections per device and I(max_concurrency) requests in flight.
+       - Defaults to C(requests) when it is installed, C(urls) otherwise.
+     choices: ['requests', 'urls', 'asyncio']
+     type: str
+   max_concurrency:
+     description:
+       - Maximum number of requests in flight to all the devices with I(transport=asyncio).
+     default: 100
+     type: int
+   retry_backoff:
+     description:
+       - Base seconds of the exponential backoff between the retries of I(max_retries).
+       - The delay is random between 0 and I(retry_backoff) * 2 ** retry, up to 30 seconds,
+         or the C(Retry-After) seconds of the WEBFRONT-K.
+     default: 0.5
+     type: float
+   connect_timeout:
+     description:
+       - Seconds to wait for the connection to the WEBFRONT-K.
+     default: 10
+     type: float
+   read_timeout:
+     description:
+       - Seconds to wait for the response of the WEBFRONT-K.
+     default: 60
+     type: float
+   rate_limit:
+     description:
+       - Maximum number of requests per second sent to each WEBFRONT-K, 0 for no limit.
+       - The requests of all the threads of the module run to a device share the limit.
+     default: 0
+     type: float
+   trace:
+     description:
+       - Return every REST call of the run in C(trace), with its method, path template, status code,
+         bytes sent and received, elapsed seconds and whether the connection was reused,
+         and the totals of the C(app_id) resolution, C(read) and C(write) phases.
+       - The C(WFK_TRACE=1) environment variable enables it for all the tasks.
+     default: False
+     type: bool
+author: Seonil Kim(@sikim-piolink)
+'''
+
+EXAMPLES = r'''
+---
+- name: Signature Catalog
+  hosts: localhost
+  collections:
+      - sikim_piolink.wfktest
+  tasks:
+      - name: Refresh the signature catalog
+        pio_sig_catalog:
+            host: "{{ host }}"
+            port: "{{ port }}"
+            username: "{{ username }}"
+            password: "{{ password }}"
+            firmware: "4.0.1"
+            max_age: 3600
+            sig_ids:
+                - "110600001"
+...
+'''
+
+RETURN = r'''
+catalog:
+    description: Path of the SQLite catalog file on the controller.
+    returned: always
+    type: str
+classes:
+    description: Status (C(updated), C(unchanged), C(fresh) or C(failed)), number of signatures and elapsed seconds of each signature class.
+    returned: always
+    type: dict
+signatures:
+    description: Catalog entry of each signature of I(sig_ids), None if the signature is unknown.
+    returned: when I(sig_ids) is used
+    type: dict
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
+'''
+
+import time
+import hashlib
+
+from ansible.module_utils.basic import AnsibleModule
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils, \
+#    prest_argument_spec, device_options, run_devices
+from ansible.module_utils.prest_utils import PrestUtils, prest_argument_spec, \
+    device_options, run_devices
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_SITE_TYPE
+from ansible.module_utils.prest_module import CMD_SITE_TYPE
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_catalog import PrestCatalog, \
+#    catalog_path, sig_class_dict, DEFAULT_FIRMWARE
+from ansible.module_utils.prest_catalog import PrestCatalog, catalog_path, \
+    sig_class_dict, DEFAULT_FIRMWARE
+
+module_args = dict(
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
+    sig_classes=dict(type='list', elements='str',
+                     choices=sorted(sig_class_dict.values())),
+    firmware=dict(type='str', default=DEFAULT_FIRMWARE),
+    max_age=dict(type='int', default=0),
+    sig_ids=dict(type='list', elements='str'),
+    workers=dict(type='int', default=len(sig_class_dict)),
+)
+module_args.update(prest_argument_spec)
+
+
+class PioSigCatalog(PrestUtils):
+    def __init__(self, module):
+        super(PioSigCatalog, self).__init__(module)
+        self.catalog = None
+
+    def fetch_class(self, sig_class, state):
+        # downloads one signature class, runs in the worker threads
+        # state = {'digest', 'etag', 'count', 'updated'} or None
+        url = self.set_url(CMD_SITE_TYPE, 'paf_sig_base', sig_class,
+                           None, None)
+        headers = None
+        if state is not None and state['etag']:
+            headers = {'If-None-Match': state['etag']}
+
+        resp, elapsed = self.timed(self.request, 'GET', url, None, headers)
+        class_result = dict(status='unchanged', count=None, elapsed=elapsed)
+        if resp.status_code == 304:
+            return class_result, None
+        if resp.status_code != 200:
+            class_result.update(status='failed',
+                                status_code=resp.status_code)
+            return class_result, None
+
+        digest = hashlib.sha1(resp.content).hexdigest()
+        if state is not None and state['digest'] == digest:
+            return class_result, None
+
+        entries = self.get_list(self.decode(resp), sig_class, 'sig_entry')
+        if entries is None:
+            entries = list()
+        class_result.update(status='updated', count=len(entries))
+
+        return class_result, (entries, digest, resp.headers.get('ETag'))
+
+    def refresh(self):
+        sig_classes = self.module.params['sig_classes'] or \
+            sorted(sig_class_dict.values())
+        max_age = self.module.params['max_age']
+
+        # SQLite connections stay in the main thread
+        states = dict((sig_class, self.catalog.get_class_state(sig_class))
+                      for sig_class in sig_classes)
+
+        classes = dict()
+        fetches = list()
+        for sig_class in sig_classes:
+            state = states[sig_class]
+            if state is not None and max_age > 0 and \
+                    time.time() - state['updated'] < max_age:
+                classes[sig_class] = dict(status='fresh',
+                                          count=state['count'], elapsed=0)
+            else:
+                fetches.append(sig_class)
+
+        fetch_results = self.run_parallel(
+            lambda sig_class: self.fetch_class(sig_class, states[sig_class]),
+            fetches, self.module.params['workers'])
+
+        for sig_class, (class_result, data) in zip(fetches, fetch_results):
+            if data is not None:
+                entries, digest, etag = data
+                self.catalog.replace_class(sig_class, entries, digest, etag)
+                self.result['changed'] = True
+            elif class_result['status'] == 'unchanged':
+                self.catalog.touch_class(sig_class)
+                class_result['count'] = states[sig_class]['count']
+            classes[sig_class] = class_result
+
+        failed = sorted([sig_class for sig_class in classes.keys()
+                         if classes[sig_class]['status'] == 'failed'])
+        self.result['classes'] = classes
+        if failed:
+            self.result['failed'] = True
+            self.result['message'] = 'Failed to download: %s' \
+                % ', '.join(failed)
+        else:
+            self.result['message'] = '%d signature classes: %d updated' % (
+                len(classes), len([c for c in classes.values()
+                                   if c['status'] == 'updated']))
+
+    def run(self):
+        # the result is built from the signature classes, not one request
+        self.aggregated = True
+        self.result['changed'] = False
+        path = catalog_path(self.module.params['cache_dir'],
+                            self.get_device(), self.module.params['firmware'])
+        self.result['catalog'] = path
+        try:
+            self.catalog = PrestCatalog(path)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to open the catalog %s: %s"
+                                  % (path, e))
+
+        try:
+            if not self.module.check_mode:
+                self.refresh()
+
+            sig_ids = self.module.params['sig_ids']
+            if sig_ids is not None:
+                self.result['signatures'] = dict(
+                    (sig_id, self.catalog.find_by_id(sig_id))
+                    for sig_id in sig_ids)
+        finally:
+            self.catalog.close()
+
+
+def main():
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioSigCatalog, module)
+
+    catalog = PioSigCatalog(module)
+    catalog.init_args()
+    catalog.run()
+    catalog.set_result()
+
+
+if __name__ == '__main__':
+    main()
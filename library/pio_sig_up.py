@@ -19,27 +19,27 @@ description:
    - You can manage Signature Management of the WEBFRONT-K.
 version_added: '2.10'
 requirements:
-    - requests
+    - requests (optional, see I(transport))
 options:
    host:
      description:
        - Enter the IPv4 address of the WEBFRONT-K.
-     required: True
+       - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
      type: str
    port:
      description:
        - Enter the port number of the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
      type: str
    username:
      description:
        - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
      type: str
    password:
      description:
        - Enter the user's password.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
      type: str
    app_name:
      description:
@@ -48,9 +48,9 @@ If the "app_name" is ALL, the configurations will be applied to all applications
      required: True
      type: str
    sig_list:
-description:
+     description:
        - Enter the lists of the signatures.
-     required: True
+       - One of I(sig_list) and I(sig_file) is required.
      type: list
      suboptions:
        sig_id:
@@ -66,6 +66,127 @@ description:
            - 3: Exception"
          choices: ["1", "2", "3"]
          type: str
+   sig_file:
+     description:
+       - Enter the path of a file with the signatures, instead of I(sig_list).
+       - The file is a CSV file with a C(sig_id,sig_status) header row, a JSON array, JSON lines (C(.jsonl))
+         or a YAML list of entries with C(sig_id) and C(sig_status), chosen by the file extension.
+       - The file is read one entry at a time and the signatures whose status changes are sent in
+         batches of I(batch_size) per signature class, the file itself is never loaded at once.
+       - Each batch is sent as soon as it is full, only the check mode and I(plan_file) keep the
+         batches in a plan.
+     type: path
+   batch_size:
+     description:
+       - Maximum number of signatures sent in one request with I(sig_file).
+     default: 1000
+     type: int
+   workers:
+     description:
+       - Maximum number of signature classes of I(sig_list) configured concurrently.
+     default: 10
+     type: int
+   catalog_firmware:
+     description:
+       - Enter the firmware version of the signature catalog downloaded by M(pio_sig_catalog).
+       - The signature IDs are checked against the local catalog before anything is sent to the WEBFRONT-K.
+     type: str
+   pool_size:
+     description:
+       - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+     default: 10
+     type: int
+   keepalive:
+     description:
+       - Reuse the connections to the WEBFRONT-K between REST calls.
+     default: True
+     type: bool
+   max_retries:
+     description:
+       - Number of times a GET, PUT or DELETE request is sent again after a connection error, a timeout
+         or a C(429) or C(5xx) status of the WEBFRONT-K.
+     default: 0
+     type: int
+   app_cache_ttl:
+     description:
+       - Seconds the application ID resolved from C(app_name) is cached on the controller.
+       - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+       - 0 disables the cache.
+     default: 300
+     type: int
+   cache_dir:
+     description:
+       - Directory of the controller-side cache files.
+     default: ~/.ansible/tmp/wfk_cache
+     type: path
+   hosts:
+     description:
+       - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+       - C(port) is used for the devices without a port.
+       - The result of each device is returned in C(devices).
+     type: list
+     elements: str
+   max_parallel:
+     description:
+       - Maximum number of devices of I(hosts) configured concurrently.
+     default: 10
+     type: int
+   transport:
+     description:
+       - Backend sending the REST calls to the WEBFRONT-K.
+       - C(requests) pools the connections with requests sessions.
+       - C(urls) uses the C(ansible.module_utils.urls) code shipped with Ansible and keeps up to
+         I(pool_size) idle connections per device, it needs no package on the managed node and
+         starts faster.
+       - C(asyncio) sends the requests of all the threads and devices from one event loop,
+         with at most I(pool_size) connections per device and I(max_concurrency) requests in flight.
+       - Defaults to C(requests) when it is installed, C(urls) otherwise.
+     choices: ['requests', 'urls', 'asyncio']
+     type: str
+   max_concurrency:
+     description:
+       - Maximum number of requests in flight to all the devices with I(transport=asyncio).
+     default: 100
+     type: int
+   retry_backoff:
+     description:
+       - Base seconds of the exponential backoff between the retries of I(max_retries).
+       - The delay is random between 0 and I(retry_backoff) * 2 ** retry, up to 30 seconds,
+         or the C(Retry-After) seconds of the WEBFRONT-K.
+     default: 0.5
+     type: float
+   connect_timeout:
+     description:
+       - Seconds to wait for the connection to the WEBFRONT-K.
+     default: 10
+     type: float
+   read_timeout:
+     description:
+       - Seconds to wait for the response of the WEBFRONT-K.
+     default: 60
+     type: float
+   rate_limit:
+     description:
+       - Maximum number of requests per second sent to each WEBFRONT-K, 0 for no limit.
+       - The requests of all the threads of the module run to a device share the limit.
+     default: 0
+     type: float
+   trace:
+     description:
+       - Return every REST call of the run in C(trace), with its method, path template, status code,
+         bytes sent and received, elapsed seconds and whether the connection was reused,
+         and the totals of the C(app_id) resolution, C(read) and C(write) phases.
+       - The C(WFK_TRACE=1) environment variable enables it for all the tasks.
+     default: False
+     type: bool
+   plan_file:
+     description:
+       - File of the plan of the writes to the WEBFRONT-K.
+       - In check mode, the device is read and the plan returned in C(plan) is saved in this file.
+       - Otherwise the saved plan is applied without reading the device again, the task fails
+         if the file has no plan of the device or it was planned with other options.
+       - The file keeps one plan per device, the devices of I(hosts) share it.
+     type: path
 author: Seonil Kim(@sikim-piolink)
 '''
 
@@ -92,29 +213,44 @@ EXAMPLES = r'''
 '''
 
 RETURN = r'''
-#
+plan:
+    description: Writes planned from the state of the device, in the order they are sent, with their method, path relative to C(/api/v2) and body.
+    returned: in check mode
+    type: list
+classes:
+    description: Number of signatures, status code, result code, elapsed seconds and result of each signature class of I(sig_list).
+    returned: when I(sig_list) is used
+    type: dict
+batches:
+    description: Signature class, number of signatures, elapsed seconds and result of each batch sent from I(sig_file).
+    returned: when I(sig_file) is used
+    type: list
+totals:
+    description: Number of signatures and batches sent from I(sig_file), and their total and maximum elapsed seconds.
+    returned: when I(sig_file) is used
+    type: dict
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
 '''
 
+from collections import OrderedDict
+
 from ansible.module_utils.basic import AnsibleModule
-#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils
-from ansible.module_utils.prest_utils import PrestUtils
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils, \
+#    prest_argument_spec, plan_argument_spec, device_options, run_devices, DEFAULT_WORKERS
+from ansible.module_utils.prest_utils import PrestUtils, prest_argument_spec, \
+    plan_argument_spec, device_options, run_devices, DEFAULT_WORKERS
 #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_SITE_TYPE
 from ansible.module_utils.prest_module import CMD_SITE_TYPE
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_stream import iter_file_entries
+from ansible.module_utils.prest_stream import iter_file_entries
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_catalog import sig_class_dict, \
+#    find_catalog
+from ansible.module_utils.prest_catalog import sig_class_dict, find_catalog
 
-sig_class_dict = {
-    '1101': 'sig_req_appac',
-    '1105': 'sig_req_buffer',
-    '1106': 'sig_req_sql',
-    '1107': 'sig_req_xss',
-    '1111': 'sig_req_upload',
-    '1112': 'sig_req_download',
-    '1114': 'sig_req_include',
-    '1115': 'sig_req_tool',
-    '1116': 'sig_req_uploadfile',
-    '1117': 'sig_req_sqllogin',
-    '1118': 'sig_req_filter',
-    '1201': 'sig_req_url',
-}
+DEFAULT_BATCH_SIZE = 1000
 
 sig_entry = dict(
     sig_id=dict(type='str', required=True),
@@ -122,19 +258,63 @@ sig_entry = dict(
 )
 
 module_args = dict(
-    host=dict(type='str', required=True),
-    port=dict(type='str', required=True),
-    username=dict(type='str', required=True),
-    password=dict(type='str', required=True, no_log=True),
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
     app_name=dict(type='str', required=True),
-    sig_list=dict(type='list', required=True,
-                  elements='dict', options=sig_entry),
+    sig_list=dict(type='list', elements='dict', options=sig_entry),
+    sig_file=dict(type='path'),
+    batch_size=dict(type='int', default=DEFAULT_BATCH_SIZE),
+    workers=dict(type='int', default=DEFAULT_WORKERS),
+    catalog_firmware=dict(type='str'),
 )
+module_args.update(prest_argument_spec)
+module_args.update(plan_argument_spec)
 
 
 class PioSigUp(PrestUtils):
     def __init__(self, module):
         super(PioSigUp, self).__init__(module)
+        self.batch_results = list()
+        # the batches of sig_file are sent as they are read, not planned
+        self.send_batches = False
+        self.catalog = None
+        # class_status = {sig_class: {sig_id: sig_status}} of the device
+        # with the planned changes
+        self.class_status = dict()
+
+    def get_sig_class(self, sig_entry):
+        # sig_id 앞의 4자리
+        sig_class = str(sig_entry['sig_id'])[:4]
+        if sig_class not in sig_class_dict.keys():
+            self.module.fail_json(msg="Invalid \"sig_id\": %s"
+                                  % sig_entry['sig_id'])
+        if self.catalog is not None and \
+                self.catalog.find_by_id(sig_entry['sig_id']) is None:
+            self.module.fail_json(msg="Unknown \"sig_id\": %s"
+                                  % sig_entry['sig_id'])
+
+        return sig_class
+
+    def open_catalog(self):
+        firmware = self.module.params['catalog_firmware']
+        if firmware is None:
+            return
+
+        self.catalog = find_catalog(self.module.params['cache_dir'],
+                                    self.get_device(), firmware)
+        if self.catalog is None:
+            self.module.fail_json(msg="No signature catalog of firmware %s, "
+                                  "run pio_sig_catalog first" % firmware)
+
+    def get_sig_url(self, sig_class, app_id):
+        if app_id == '0':
+            return self.set_url(CMD_SITE_TYPE, 'paf_sig_base',
+                                sig_class_dict[sig_class], None, None)
+
+        return self.set_url(CMD_SITE_TYPE, 'paf_sig_settle',
+                            sig_class_dict[sig_class], None, None)
 
     def set_sig(self, app_id):
         # sig_dict = {sig_class: [{sig_id, sig_status}, {..., ...}], ...}
@@ -143,12 +323,7 @@ class PioSigUp(PrestUtils):
         sig_list = self.module.params['sig_list']
         for idx in range(0, len(sig_list)):
             sig_entry = sig_list[idx]
-
-            # sig_id 앞의 4자리
-            sig_class = sig_entry['sig_id'][:4]
-            if sig_class not in sig_class_dict.keys():
-                self.module.fail_json(msg="Invalid \"sig_id\": %s"
-                                      % sig_entry['sig_id'])
+            sig_class = self.get_sig_class(sig_entry)
 
             if sig_class not in sig_dict.keys():
                 sig_class_list = list()
@@ -161,28 +336,157 @@ class PioSigUp(PrestUtils):
 
         return sig_dict
 
-    def set_sig_status(self, sig_dict, app_id):
-        for k, v in sig_dict.items():
-            if app_id == '0':
-                url = self.set_url(CMD_SITE_TYPE, 'paf_sig_base',
-                                   sig_class_dict[k], None, None)
-            else:
-                url = self.set_url(CMD_SITE_TYPE, 'paf_sig_settle',
-                                   sig_class_dict[k], None, None)
-            body = {'sig_entry': sig_dict[k]}
-            self.resp = self.put(url, body)
+    def plan_sig_class(self, sig_class, sig_class_list, app_id):
+        # PUT of the signatures whose status is not the one of the list,
+        # the last entry wins if several entries are the same signature
+        sig_status = self.class_status.get(sig_class)
+        if sig_status is None:
+            sig_status = self.class_status[sig_class] = self.get_sig_status(
+                sig_class_dict[sig_class], app_id)
 
-    def run(self):
-        if self.module.check_mode:
-            return self.result
+        sig_entries = OrderedDict((sig_entry['sig_id'], sig_entry)
+                                  for sig_entry in sig_class_list)
+        changes = [sig_entry for sig_id, sig_entry in sig_entries.items()
+                   if sig_status.get(sig_id) != sig_entry['sig_status']]
+        if not changes:
+            return
 
-        app_id = self.get_app_id()
+        for sig_entry in changes:
+            sig_status[sig_entry['sig_id']] = sig_entry['sig_status']
+        url = self.get_sig_url(sig_class, app_id)
+        if self.send_batches:
+            self.batch_results.append(self.apply_step(self.make_step(
+                'PUT', url, {'sig_entry': changes})))
+        elif self.module.params['sig_file'] is not None:
+            # the batches of the file are sent in its order
+            self.add_step('PUT', url, {'sig_entry': changes})
+        else:
+            # one PUT per signature class, sent concurrently
+            self.add_step('PUT', url, {'sig_entry': changes}, sig_class)
+
+    def plan_sig_list(self, app_id):
         sig_dict = self.set_sig(app_id)
-        self.set_sig_status(sig_dict, app_id)
+        sig_classes = sorted(sig_dict.keys())
+
+        # the signature classes are read concurrently
+        class_status = self.run_parallel(
+            lambda k: self.get_sig_status(sig_class_dict[k], app_id),
+            sig_classes, self.module.params['workers'])
+        self.class_status.update(zip(sig_classes, class_status))
+
+        for sig_class in sig_classes:
+            self.plan_sig_class(sig_class, sig_dict[sig_class], app_id)
+
+    def plan_sig_file(self, app_id):
+        # sig_dict = {sig_class: [{sig_id, sig_status}, ...]} of the batches
+        # being filled, a batch is planned as soon as it is full
+        sig_dict = dict()
+        batch_size = self.module.params['batch_size']
+        try:
+            for sig_entry in iter_file_entries(self.module.params['sig_file']):
+                if not isinstance(sig_entry, dict) or \
+                        'sig_id' not in sig_entry or \
+                        str(sig_entry.get('sig_status')) not in \
+                        ('1', '2', '3'):
+                    self.module.fail_json(msg="Invalid signature entry: %s"
+                                          % sig_entry)
+                sig_class = self.get_sig_class(sig_entry)
+
+                sig_class_list = sig_dict.setdefault(sig_class, list())
+                sig_class_list.append({'sig_id': str(sig_entry['sig_id']),
+                                       'sig_status':
+                                           str(sig_entry['sig_status']),
+                                       'app_id': app_id})
+                if len(sig_class_list) >= batch_size:
+                    self.plan_sig_class(sig_class, sig_dict.pop(sig_class),
+                                        app_id)
+        except (IOError, OSError, ValueError) as e:
+            self.module.fail_json(msg="Failed to read the sig_file: %s" % e)
+
+        for sig_class in sorted(sig_dict.keys()):
+            self.plan_sig_class(sig_class, sig_dict[sig_class], app_id)
+
+    def apply_step(self, step):
+        # the signature PUTs are timed, the application creation is not
+        if step['method'] != 'PUT':
+            return super(PioSigUp, self).apply_step(step)
+
+        step_result, elapsed = self.timed(super(PioSigUp, self).apply_step,
+                                          step)
+        step_result.update(sig_class=step['path'].split('/')[-1],
+                           count=len(step['body']['sig_entry']),
+                           elapsed=elapsed)
+
+        return step_result
+
+    def set_batch_results(self):
+        elapsed = [r['elapsed'] for r in self.batch_results]
+        self.result['batches'] = self.batch_results
+        self.result['totals'] = dict(
+            signatures=sum([r['count'] for r in self.batch_results]),
+            batches=len(self.batch_results),
+            elapsed=round(sum(elapsed), 6),
+            max_elapsed=max(elapsed or [0]))
+
+    def apply_plan(self):
+        if not self.steps:
+            return super(PioSigUp, self).apply_plan()
+
+        # the application of a planned app_id is created first, then the
+        # signatures are sent with its app_id
+        step_results = self.apply_steps(self.steps)
+        sig_results = [step_result for step, step_result in step_results
+                       if step['method'] == 'PUT']
+        if self.module.params['sig_file'] is not None:
+            self.batch_results = sig_results
+            self.set_batch_results()
+        else:
+            self.result['classes'] = dict((r['sig_class'], r)
+                                          for r in sig_results)
+        self.aggregate_result([step_result for step, step_result
+                               in step_results])
+
+    def send_sig_file(self):
+        # the batches are sent as the file is read, so neither the file nor
+        # the plan is held in memory
+        app_id = self.get_app_id()
+        self.send_batches = True
+        self.plan_sig_file(app_id)
+        if not self.batch_results:
+            self.result['message'] = 'Already configured'
+            self.aggregated = True
+            return
+
+        self.set_batch_results()
+        self.aggregate_result(self.batch_results)
+
+    def plan(self):
+        app_id = self.get_app_id(create=False)
+        if self.module.params['sig_file'] is not None:
+            self.plan_sig_file(app_id)
+        else:
+            self.plan_sig_list(app_id)
+
+    def run(self):
+        self.open_catalog()
+        if self.module.params['sig_file'] is not None and \
+                not self.module.check_mode and \
+                self.module.params['plan_file'] is None:
+            self.send_sig_file()
+            return
+
+        self.run_plan()
 
 
 def main():
-    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options,
+                                               ['sig_list', 'sig_file']],
+                           required_one_of=[['sig_list', 'sig_file']],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioSigUp, module)
+
     sig = PioSigUp(module)
     sig.init_args()
     sig.run()
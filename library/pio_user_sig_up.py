@@ -19,24 +19,24 @@ description:
    - You can manage User-defined Signature Management of the WEBFRONT-K.
 version_added: '2.10'
 requirements:
-   - requests
+   - requests (optional, see I(transport))
 options:
    host:
      description:
        - Enter the IPv4 address of the WEBFRONT-K.
-     required: True
+       - One of I(host) and I(hosts) is required, unless the task uses the C(httpapi) connection.
    port:
      description:
        - Enter the port number of the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
    username:
      description:
        - Enter the User ID of the WEBFRONT-K. The ID must have permissions for the WEBFRONT-K.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
    password:
      description:
        - Enter the user's password.
-     required: True
+       - Not required when the task uses the C(httpapi) connection.
    app_name:
      description:
        - Enter the application names to apply configurations of the user-defined signatures. "Application" means the applications provided by the WEBFRONT-K. If the "app_name" is ALL, the configurations are applied to all applications.
@@ -71,6 +71,102 @@ options:
          description:
           - Enther a description of the user-defined signature.
          required: True
+   pool_size:
+     description:
+       - Maximum number of keep-alive connections kept open to the WEBFRONT-K.
+     default: 10
+     type: int
+   keepalive:
+     description:
+       - Reuse the connections to the WEBFRONT-K between REST calls.
+     default: True
+     type: bool
+   max_retries:
+     description:
+       - Number of times a GET, PUT or DELETE request is sent again after a connection error, a timeout
+         or a C(429) or C(5xx) status of the WEBFRONT-K.
+     default: 0
+     type: int
+   app_cache_ttl:
+     description:
+       - Seconds the application ID resolved from C(app_name) is cached on the controller.
+       - The cached ID is dropped when the WEBFRONT-K no longer knows it.
+       - 0 disables the cache.
+     default: 300
+     type: int
+   cache_dir:
+     description:
+       - Directory of the controller-side cache files.
+     default: ~/.ansible/tmp/wfk_cache
+     type: path
+   hosts:
+     description:
+       - Enter the list of the WEBFRONT-K devices to configure at once, as C(address) or C(address:port).
+       - C(port) is used for the devices without a port.
+       - The result of each device is returned in C(devices).
+     type: list
+     elements: str
+   max_parallel:
+     description:
+       - Maximum number of devices of I(hosts) configured concurrently.
+     default: 10
+     type: int
+   transport:
+     description:
+       - Backend sending the REST calls to the WEBFRONT-K.
+       - C(requests) pools the connections with requests sessions.
+       - C(urls) uses the C(ansible.module_utils.urls) code shipped with Ansible and keeps up to
+         I(pool_size) idle connections per device, it needs no package on the managed node and
+         starts faster.
+       - C(asyncio) sends the requests of all the threads and devices from one event loop,
+         with at most I(pool_size) connections per device and I(max_concurrency) requests in flight.
+       - Defaults to C(requests) when it is installed, C(urls) otherwise.
+     choices: ['requests', 'urls', 'asyncio']
+     type: str
+   max_concurrency:
+     description:
+       - Maximum number of requests in flight to all the devices with I(transport=asyncio).
+     default: 100
+     type: int
+   retry_backoff:
+     description:
+       - Base seconds of the exponential backoff between the retries of I(max_retries).
+       - The delay is random between 0 and I(retry_backoff) * 2 ** retry, up to 30 seconds,
+         or the C(Retry-After) seconds of the WEBFRONT-K.
+     default: 0.5
+     type: float
+   connect_timeout:
+     description:
+       - Seconds to wait for the connection to the WEBFRONT-K.
+     default: 10
+     type: float
+   read_timeout:
+     description:
+       - Seconds to wait for the response of the WEBFRONT-K.
+     default: 60
+     type: float
+   rate_limit:
+     description:
+       - Maximum number of requests per second sent to each WEBFRONT-K, 0 for no limit.
+       - The requests of all the threads of the module run to a device share the limit.
+     default: 0
+     type: float
+   trace:
+     description:
+       - Return every REST call of the run in C(trace), with its method, path template, status code,
+         bytes sent and received, elapsed seconds and whether the connection was reused,
+         and the totals of the C(app_id) resolution, C(read) and C(write) phases.
+       - The C(WFK_TRACE=1) environment variable enables it for all the tasks.
+     default: False
+     type: bool
+   plan_file:
+     description:
+       - File of the plan of the writes to the WEBFRONT-K.
+       - In check mode, the device is read and the plan returned in C(plan) is saved in this file.
+       - Otherwise the saved plan is applied without reading the device again, the task fails
+         if the file has no plan of the device or it was planned with other options.
+       - The file keeps one plan per device, the devices of I(hosts) share it.
+     type: path
 
 author: Seonil Kim(@sikim-piolink)
 '''
@@ -103,12 +199,21 @@ EXAMPLES = r'''
 '''
 
 RETURN = r'''
-#
+plan:
+    description: Writes planned from the state of the device, in the order they are sent, with their method, path relative to C(/api/v2) and body.
+    returned: in check mode
+    type: list
+trace:
+    description: Device, REST calls and per-phase totals (C(app_id), C(read), C(write)) of the run.
+    returned: when I(trace) is enabled
+    type: dict
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils
-from ansible.module_utils.prest_utils import PrestUtils
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils, \
+#    prest_argument_spec, plan_argument_spec, device_options, run_devices
+from ansible.module_utils.prest_utils import PrestUtils, prest_argument_spec, \
+    plan_argument_spec, device_options, run_devices
 #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_SITE_TYPE
 from ansible.module_utils.prest_module import CMD_SITE_TYPE
 
@@ -133,15 +238,17 @@ sig_entry = dict(
 )
 
 module_args = dict(
-    host=dict(type='str', required=True),
-    port=dict(type='str', required=True),
-    username=dict(type='str', required=True),
-    password=dict(type='str', required=True, no_log=True),
+    host=dict(type='str'),
+    port=dict(type='str'),
+    username=dict(type='str'),
+    password=dict(type='str', no_log=True),
     app_name=dict(type='str', required=True),
     sig_class=dict(type='str', required=True, choices=sig_class_list),
     sig_list=dict(type='list', required=True,
                   elements='dict', options=sig_entry),
 )
+module_args.update(prest_argument_spec)
+module_args.update(plan_argument_spec)
 
 
 class PioUserSigUp(PrestUtils):
@@ -155,18 +262,31 @@ class PioUserSigUp(PrestUtils):
                                self.module.params['sig_class'],
                                None, None)
         sig_list = self.module.params['sig_list']
+        # the catalog is read once, entry by entry, and only its signatures
+        # of sig_list are kept, indexed by sig_content
+        contents = set(sig_entry['sig_content'] for sig_entry in sig_list)
+        content_index = dict()
+        for entry in self.iter_entries(get_url,
+                                       self.module.params['sig_class'],
+                                       'sig_entry'):
+            if isinstance(entry, dict) and \
+                    entry.get('sig_content') in contents:
+                content_index.setdefault(entry['sig_content'], entry)
+        # post_body_idx = {sig_content: index of post_body_list}
+        # put_body_idx = {sig_id: index of put_body_list}
+        post_body_idx = dict()
+        put_body_idx = dict()
+
         for idx in range(0, len(sig_list)):
             sig_entry = sig_list[idx]
-            src_sig_entry = self.get_entry(get_url, 'sig_content',
-                                           sig_entry['sig_content'],
-                                           self.module.params['sig_class'],
-                                           'sig_entry')
+            src_sig_entry = content_index.get(sig_entry['sig_content'])
             if src_sig_entry is None:
                 body_dict = {'sig_content': sig_entry['sig_content'],
                              'sig_status': sig_entry['sig_status'],
                              'sig_type': sig_entry['sig_type'],
                              'sig_ko_desc': sig_entry['sig_ko_desc']}
-                self.post_body_list.append(body_dict)
+                self.add_body(self.post_body_list, post_body_idx,
+                              sig_entry['sig_content'], body_dict)
             else:
                 if app_id == '0':
                     if self.module.params['sig_class'] == 'sig_req_appac' or \
@@ -186,9 +306,42 @@ class PioUserSigUp(PrestUtils):
                                  'sig_status': sig_entry['sig_status'],
                                  'app_id': app_id}
 
-                self.put_body_list.append(body_dict)
+                self.add_body(self.put_body_list, put_body_idx,
+                              src_sig_entry['sig_id'], body_dict)
+
+        # the signatures already configured are not sent again
+        if app_id == '0':
+            id_index = dict((entry.get('sig_id'), entry)
+                            for entry in content_index.values())
+            self.put_body_list = [
+                body_dict for body_dict in self.put_body_list
+                if not self.is_same_sig(id_index[body_dict['sig_id']],
+                                        body_dict)]
+        elif self.put_body_list:
+            sig_status = self.get_sig_status(self.module.params['sig_class'],
+                                             app_id)
+            self.put_body_list = [
+                body_dict for body_dict in self.put_body_list
+                if sig_status.get(str(body_dict['sig_id'])) !=
+                body_dict['sig_status']]
+
+    def is_same_sig(self, src_sig_entry, body_dict):
+        # the signature of the catalog has the values of body_dict
+        for key, value in body_dict.items():
+            if str(src_sig_entry.get(key)) != str(value):
+                return False
 
-    def send_sig(self, app_id):
+        return True
+
+    def add_body(self, body_list, body_idx, key, body_dict):
+        # the last entry wins if several entries are the same signature
+        if key in body_idx:
+            body_list[body_idx[key]] = body_dict
+        else:
+            body_idx[key] = len(body_list)
+            body_list.append(body_dict)
+
+    def plan_sig(self, app_id):
         if app_id == '0':
             url = self.set_url(CMD_SITE_TYPE, 'paf_sig_base',
                                self.module.params['sig_class'], None, None)
@@ -197,23 +350,26 @@ class PioUserSigUp(PrestUtils):
                                self.module.params['sig_class'], None, None)
 
         if len(self.post_body_list) is not 0:
-            body = {'sig_entry': self.post_body_list}
-            self.resp = self.post(url, body)
+            self.add_step('POST', url, {'sig_entry': self.post_body_list})
         if len(self.put_body_list) is not 0:
-            body = {'sig_entry': self.put_body_list}
-            self.resp = self.put(url, body)
-
-    def run(self):
-        if self.module.check_mode:
-            return self.result
+            self.add_step('PUT', url, {'sig_entry': self.put_body_list})
 
-        app_id = self.get_app_id()
+    def plan(self):
+        app_id = self.get_app_id(create=False)
         self.set_sig_body(app_id)
-        self.send_sig(app_id)
+        self.plan_sig(app_id)
+
+    def run(self):
+        self.run_plan()
 
 
 def main():
-    module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
+    module = AnsibleModule(argument_spec=module_args,
+                           mutually_exclusive=[device_options],
+                           supports_check_mode=True)
+    if module.params['hosts'] is not None:
+        run_devices(PioUserSigUp, module)
+
     sig = PioUserSigUp(module)
     sig.init_args()
     sig.run()
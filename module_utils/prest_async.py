@@ -0,0 +1,373 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import time
+import socket
+import threading
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import PrestResponse, \
+#    PrestTransportError, DEFAULT_POOL_SIZE, \
+#    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, RETRY_ERRORS, has_module
+from ansible.module_utils.prest_module import PrestResponse, \
+    PrestTransportError, DEFAULT_POOL_SIZE, \
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, RETRY_ERRORS, has_module
+
+DEFAULT_MAX_CONCURRENCY = 100
+
+# asyncio is imported by the first AsyncTransport, so that the tasks using
+# the other transports do not pay for its import time
+asyncio = None
+HAS_ASYNCIO = has_module('asyncio')
+
+
+def load_asyncio():
+    global asyncio
+    if asyncio is None:
+        import asyncio
+
+
+# the single AsyncTransport of the process, shared by all the devices so
+# that max_concurrency caps the requests of the whole run
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_async_transport(max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                        keepalive=True):
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = AsyncTransport(max_concurrency, keepalive)
+
+        return _transport
+
+
+def close_async_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.shutdown()
+            _transport = None
+
+
+# HTTP/1.1 client on asyncio streams
+# One event loop thread sends the requests of all the threads and coroutines
+# of the process, a semaphore per host caps the connections to each device
+# and a global semaphore caps the requests in flight.
+class AsyncTransport(object):
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 keepalive=True):
+        import ssl
+        load_asyncio()
+
+        self.max_concurrency = max_concurrency
+        self.keepalive = keepalive
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+
+        # the semaphores are created in the event loop on first use
+        self.limit = None
+        # host_limits = {(scheme, host, port): asyncio.Semaphore}
+        self.host_limits = dict()
+        # idle = {(scheme, host, port): [(reader, writer), ...]}
+        self.idle = dict()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, coro):
+        # runs coro in the event loop and waits for its result
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def request(self, method, url, data=None, headers=None, stats=None,
+                pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        return self.run(self.arequest(method, url, data, headers, stats,
+                                      pool_size, timeout))
+
+    async def arequest(self, method, url, data=None, headers=None,
+                       stats=None, pool_size=DEFAULT_POOL_SIZE,
+                       timeout=None):
+        # timeout = (connect timeout, read timeout)
+        parts = urlsplit(url)
+        default_port = 443 if parts.scheme == 'https' else 80
+        key = (parts.scheme, parts.hostname, parts.port or default_port)
+
+        if self.limit is None:
+            self.limit = asyncio.Semaphore(self.max_concurrency)
+        host_limit = self.host_limits.get(key)
+        if host_limit is None:
+            host_limit = self.host_limits[key] = asyncio.Semaphore(pool_size)
+
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        body = b''
+        if data is not None:
+            body = to_bytes(json.dumps(data))
+        head = ['%s %s HTTP/1.1' % (method, target),
+                'Host: %s' % parts.netloc,
+                'Content-Length: %d' % len(body),
+                'Connection: %s' % ('keep-alive' if self.keepalive
+                                    else 'close')]
+        for name, value in (headers or dict()).items():
+            if value:
+                head.append('%s: %s' % (name, value))
+        message = to_bytes('\r\n'.join(head) + '\r\n\r\n') + body
+
+        # the host slot is taken first, so that the requests waiting for a
+        # busy device do not hold the slots of the other devices
+        async with host_limit:
+            async with self.limit:
+                return await self.send(key, method, message, stats,
+                                       timeout or (DEFAULT_CONNECT_TIMEOUT,
+                                                   DEFAULT_READ_TIMEOUT))
+
+    async def send(self, key, method, message, stats=None, timeout=None):
+        connect_timeout, read_timeout = timeout
+        idle = self.idle.setdefault(key, list())
+        while True:
+            reused = bool(idle)
+            try:
+                if reused:
+                    reader, writer = idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        self.connect(key), connect_timeout)
+            except asyncio.TimeoutError:
+                raise socket.timeout('connect timed out')
+
+            try:
+                writer.write(message)
+                await writer.drain()
+                status_code, headers, body, keep = await asyncio.wait_for(
+                    self.read_response(reader, method), read_timeout)
+            except asyncio.TimeoutError:
+                writer.close()
+                raise socket.timeout('read timed out')
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                # ValueError: malformed status line or chunk size
+                writer.close()
+                # the device closed the idle keep-alive connection
+                if reused:
+                    continue
+                raise socket.error(str(e))
+            break
+
+        if keep and self.keepalive:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+        if stats is not None:
+            stats['requests'] += 1
+            stats['reused' if reused else 'new'] += 1
+
+        resp = PrestResponse(status_code, to_text(body), headers)
+        resp.reused = reused
+
+        return resp
+
+    async def connect(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            return await asyncio.open_connection(host, port,
+                                                 ssl=self.ssl_context)
+
+        return await asyncio.open_connection(host, port)
+
+    async def read_response(self, reader, method):
+        # (status code, {header: value}, body, keep-alive)
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(status_line, None)
+        version, status_code = to_text(status_line).split(None, 2)[:2]
+        status_code = int(status_code)
+
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, sep, value = to_text(line).partition(':')
+            headers[name.strip()] = value.strip()
+        lowered = dict((name.lower(), value)
+                       for name, value in headers.items())
+
+        keep = version != 'HTTP/1.0' and \
+            lowered.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status_code in (204, 304) or \
+                100 <= status_code < 200:
+            return status_code, headers, b'', keep
+
+        if lowered.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # trailer headers up to the empty line
+                    while (await reader.readline()) not in (b'\r\n', b'\n',
+                                                            b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status_code, headers, b''.join(chunks), keep
+
+        if 'content-length' in lowered:
+            body = await reader.readexactly(int(lowered['content-length']))
+            return status_code, headers, body, keep
+
+        # the body ends with the connection
+        return status_code, headers, await reader.read(), False
+
+    async def close(self):
+        for idle in self.idle.values():
+            for reader, writer in idle:
+                writer.close()
+        self.idle.clear()
+
+    def shutdown(self):
+        self.run(self.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# async versions of the PrestUtils helpers for the fan-out code, e.g.
+#   results = self.run_async(self.agather(
+#       lambda url: self.aget(url), urls))
+class PrestAsyncUtils(object):
+    def run_async(self, coro):
+        # runs coro in the event loop of the asyncio transport
+        try:
+            return self.async_transport.run(coro)
+        except PrestTransportError as e:
+            self.module.fail_json(msg=str(e))
+
+    async def agather(self, coro_func, items):
+        # returns [await coro_func(item), ...] in the order of items
+        return list(await asyncio.gather(*[coro_func(item)
+                                           for item in items]))
+
+    async def arequest(self, method, url, data=None, headers=None):
+        # request() of PrestUtils, the app_id of a 404 is read again by a
+        # worker thread so that the event loop keeps sending
+        app_id = self.get_url_app_id(url)
+        if app_id in self.stale_ids:
+            app_id = self.stale_ids[app_id]
+            url = self.set_url_app_id(url, app_id)
+
+        resp = await self.asend(method, url, data, headers)
+        if resp.status_code != 404 or app_id is None:
+            return resp
+
+        new_id = await self.async_transport.loop.run_in_executor(
+            None, self.resolve_stale_app_id, app_id)
+        if new_id is None or new_id == app_id:
+            return resp
+        url = self.set_url_app_id(url, new_id)
+        resp = await self.asend(method, url, data, headers)
+        if resp.status_code == 404:
+            raise PrestTransportError('%s %s failed: HTTP 404 with the '
+                                      'app_id read again for the stale '
+                                      'cached app_id %s'
+                                      % (method, url, app_id))
+
+        return resp
+
+    async def asend(self, method, url, data=None, headers=None):
+        if headers is not None:
+            headers = dict(self.headers, **headers)
+        else:
+            headers = self.headers
+
+        # request() with asyncio.sleep, the errors are raised as
+        # PrestTransportError since fail_json must not exit the event loop
+        start = time.time()
+        attempt = 0
+        while True:
+            delay = self.throttle()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                resp = await self.async_transport.arequest(
+                    method, url, data, headers, self.conn_stats,
+                    self.pool_size, self.timeout)
+            except RETRY_ERRORS as e:
+                if not self.should_retry(method, attempt):
+                    self.record(method, url, data, None, start, attempt)
+                    raise PrestTransportError('%s %s failed: %s'
+                                              % (method, url, e))
+                resp = None
+            else:
+                if not self.should_retry(method, attempt, resp):
+                    self.record(method, url, data, resp, start, attempt)
+                    break
+
+            with self.stats_lock:
+                self.conn_stats['retries'] += 1
+            await asyncio.sleep(self.retry_delay(attempt, resp))
+            attempt += 1
+
+        return resp
+
+    async def aget(self, url):
+        return await self.arequest('GET', url)
+
+    async def aput(self, url, data):
+        return await self.arequest('PUT', url, data)
+
+
+# async set_app_policy() of PrestReq
+# With the asyncio transport, the statuses of all the applications are read
+# and written by coroutines of the event loop instead of nested worker
+# threads, capped by pool_size per device and max_concurrency.
+class PrestAsyncReq(object):
+    async def aget_req_status(self, app_id, req_name=None):
+        resp = await self.aget(self.req_status_url(app_id, req_name))
+
+        return self.find_status(self.decode(resp))
+
+    async def aset_req_status(self, app_id, req_name, body):
+        start = time.time()
+        resp = await self.aput(self.req_status_url(app_id, req_name), body)
+        req_result = self.parse_result(resp, app_id)
+        req_result.update(elapsed=round(time.time() - start, 6))
+
+        return req_result
+
+    async def aset_app_policy(self, app):
+        app_name, app_id = app
+        policy = self.get_req_policy()
+        req_names = sorted(policy.keys())
+
+        before = dict(zip(req_names, await self.agather(
+            lambda req_name: self.aget_req_status(app_id, req_name),
+            req_names)))
+        changes = [req_name for req_name in req_names
+                   if not self.is_same_status(before[req_name],
+                                              policy[req_name])]
+        put_results = dict(zip(changes, await self.agather(
+            lambda req_name: self.aset_req_status(app_id, req_name,
+                                                  policy[req_name]),
+            changes)))
+
+        return app_name, self.policy_result(app_id, policy, before,
+                                            put_results)
+
+    async def aset_policies(self, app_ids):
+        # [(app_name, app result), ...] of all the applications
+        return await self.agather(self.aset_app_policy, list(app_ids.items()))
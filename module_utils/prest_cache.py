@@ -0,0 +1,141 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+
+from ansible.module_utils._text import to_bytes
+
+DEFAULT_CACHE_TTL = 300
+DEFAULT_CACHE_DIR = '~/.ansible/tmp/wfk_cache'
+
+
+# JSON file cache shared by the module runs on the controller
+# cache file = {name: {'value': value, 'time': stored time}}
+class PrestCache(object):
+    def __init__(self, cache_dir, device, kind, ttl=DEFAULT_CACHE_TTL):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        digest = hashlib.sha1(to_bytes(device)).hexdigest()
+        self.path = os.path.join(self.cache_dir,
+                                 '%s-%s.json' % (kind, digest))
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return dict()
+
+    def get(self, name):
+        return self.get_many([name]).get(name)
+
+    def get_many(self, names):
+        # {name: value} of the names cached and not expired, with one read
+        # of the file for all of the names
+        cache = self.load()
+        now = time.time()
+        values = dict()
+        for name in names:
+            entry = cache.get(name)
+            if entry is None or now - entry['time'] > self.ttl:
+                self.misses += 1
+                continue
+            self.hits += 1
+            values[name] = entry['value']
+
+        return values
+
+    def set(self, name, value):
+        self.set_many({name: value})
+
+    def set_many(self, values):
+        # values = {name: value}, stored with one locked rewrite of the file
+        if not values:
+            return
+
+        def _set(cache):
+            now = time.time()
+            for name, value in values.items():
+                cache[name] = {'value': value, 'time': now}
+        self.update(_set)
+
+    def delete(self, name):
+        def _delete(cache):
+            cache.pop(name, None)
+        self.update(_delete)
+
+    def update(self, func):
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir, 0o700)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+        # forks updating the same file are serialized by the lock file,
+        # readers only ever see a complete file thanks to the rename.
+        with open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                cache = self.load()
+                now = time.time()
+                for name in list(cache.keys()):
+                    if now - cache[name]['time'] > self.ttl:
+                        del cache[name]
+                func(cache)
+
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir,
+                                                prefix='.tmp-')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(cache, f)
+                os.rename(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses)
+
+
+# PrestCache kept by the httpapi connection process between the tasks
+class PrestConnectionCache(PrestCache):
+    def __init__(self, connection, kind, ttl=DEFAULT_CACHE_TTL):
+        self.connection = connection
+        self.kind = kind
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name):
+        return self.get_many([name]).get(name)
+
+    def get_many(self, names):
+        # one call of the connection for all of the names
+        values = self.connection.cache_get_many(self.kind, list(names),
+                                                self.ttl)
+        self.hits += len(values)
+        self.misses += len(names) - len(values)
+
+        return values
+
+    def set(self, name, value):
+        self.set_many({name: value})
+
+    def set_many(self, values):
+        if values:
+            self.connection.cache_set_many(self.kind, values)
+
+    def delete(self, name):
+        self.connection.cache_delete(self.kind, name)
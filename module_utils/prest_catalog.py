@@ -0,0 +1,133 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+from ansible.module_utils._text import to_bytes
+
+# sig_id 앞의 4자리: signature class
+sig_class_dict = {
+    '1101': 'sig_req_appac',
+    '1105': 'sig_req_buffer',
+    '1106': 'sig_req_sql',
+    '1107': 'sig_req_xss',
+    '1111': 'sig_req_upload',
+    '1112': 'sig_req_download',
+    '1114': 'sig_req_include',
+    '1115': 'sig_req_tool',
+    '1116': 'sig_req_uploadfile',
+    '1117': 'sig_req_sqllogin',
+    '1118': 'sig_req_filter',
+    '1201': 'sig_req_url',
+}
+
+DEFAULT_FIRMWARE = 'default'
+
+CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sig_class (
+    sig_class TEXT PRIMARY KEY,
+    digest TEXT,
+    etag TEXT,
+    count INTEGER,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS sig (
+    sig_class TEXT,
+    sig_id TEXT,
+    sig_content TEXT,
+    sig_status TEXT,
+    sig_type TEXT,
+    entry TEXT,
+    PRIMARY KEY (sig_class, sig_id)
+);
+CREATE INDEX IF NOT EXISTS sig_id_idx ON sig (sig_id);
+'''
+
+
+def catalog_path(cache_dir, device, firmware=DEFAULT_FIRMWARE):
+    # one catalog file per device and firmware version
+    digest = hashlib.sha1(to_bytes('%s|%s' % (device, firmware))).hexdigest()
+
+    return os.path.join(os.path.expanduser(cache_dir),
+                        'sig_catalog-%s.db' % digest)
+
+
+def find_catalog(cache_dir, device, firmware=DEFAULT_FIRMWARE):
+    # PrestCatalog loaded by pio_sig_catalog, or None
+    path = catalog_path(cache_dir, device, firmware)
+    if not os.path.isfile(path):
+        return None
+
+    return PrestCatalog(path)
+
+
+# Local SQLite mirror of the paf_sig_base signature catalogs of a device
+class PrestCatalog(object):
+    def __init__(self, path):
+        self.path = path
+        cache_dir = os.path.dirname(path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir, 0o700)
+            except OSError:
+                if not os.path.isdir(cache_dir):
+                    raise
+
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(CATALOG_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def get_class_state(self, sig_class):
+        # {'digest', 'etag', 'count', 'updated'} or None if never loaded
+        row = self.db.execute('SELECT * FROM sig_class WHERE sig_class = ?',
+                              (sig_class,)).fetchone()
+        if row is None:
+            return None
+
+        return dict(row)
+
+    def replace_class(self, sig_class, entries, digest, etag=None):
+        with self.db:
+            self.db.execute('DELETE FROM sig WHERE sig_class = ?',
+                            (sig_class,))
+            self.db.executemany(
+                'INSERT OR REPLACE INTO sig VALUES (?, ?, ?, ?, ?, ?)',
+                ((sig_class, str(entry.get('sig_id')),
+                  entry.get('sig_content'), entry.get('sig_status'),
+                  entry.get('sig_type'), json.dumps(entry))
+                 for entry in entries))
+            self.db.execute(
+                'INSERT OR REPLACE INTO sig_class VALUES (?, ?, ?, ?, ?)',
+                (sig_class, digest, etag, len(entries), time.time()))
+
+    def touch_class(self, sig_class):
+        with self.db:
+            self.db.execute('UPDATE sig_class SET updated = ? '
+                            'WHERE sig_class = ?', (time.time(), sig_class))
+
+    def find_by_id(self, sig_id):
+        row = self.db.execute('SELECT entry FROM sig WHERE sig_id = ?',
+                              (str(sig_id),)).fetchone()
+        if row is None:
+            return None
+
+        return json.loads(row['entry'])
+
+    def summary(self):
+        # {sig_class: {'count', 'updated'}}
+        return dict((row['sig_class'], dict(count=row['count'],
+                                            updated=row['updated']))
+                    for row in self.db.execute('SELECT * FROM sig_class'))
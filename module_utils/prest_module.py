@@ -7,48 +7,469 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import re
+import json
+import time
 import base64
+import random
 import syslog
+import threading
 try:
-    import requests
-    HAS_REQUESTS = True
+    from importlib.util import find_spec
 except ImportError:
-    HAS_REQUESTS = False
+    # Python 2
+    find_spec = None
 
-from ansible.module_utils._text import to_bytes
+from ansible.module_utils._text import to_bytes, to_text
 from ansible.module_utils.basic import missing_required_lib
+from ansible.module_utils.connection import Connection, \
+    ConnectionError as HttpApiConnectionError
+
+
+def has_module(name):
+    # whether name is installed, without the cost of importing it
+    if find_spec is not None:
+        return find_spec(name) is not None
+
+    import imp
+    try:
+        imp.find_module(name)
+    except ImportError:
+        return False
+
+    return True
+
+
+# requests is imported by the requests transport only
+HAS_REQUESTS = has_module('requests')
 
 CMD_SITE_TYPE = 'site'
 CMD_APP_TYPE = 'app'
 CMD_AMSS_TYPE = 'amss'
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 0
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 30
+# bytes read at once from the streamed response bodies
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# only the idempotent requests are sent again
+RETRY_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+# the device is busy (committing the configuration, ...)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# connection errors and timeouts, requests.RequestException is an IOError,
+# the errors of the httpapi connection come as its ConnectionError
+RETRY_ERRORS = (IOError, OSError, HttpApiConnectionError)
+
+# WFK_TRACE=1 enables the trace option of all the tasks
+TRACE_ENV = 'WFK_TRACE'
+APP_PATH = re.compile(r'/app/[^/]+/')
+
+
+def path_template(url):
+    # '/app/{app_id}/app-gen/ip-list' of '.../api/v2/app/3/app-gen/ip-list'
+    return APP_PATH.sub('/app/{app_id}/', url.split('/api/v2', 1)[-1],
+                        count=1)
+
+
+# reused = whether the last request of the thread was sent on a kept-alive
+# connection, set by the connections of the requests sessions
+_request_local = threading.local()
+# pool_classes = {scheme: urllib3 connection pool class}
+_pool_classes = dict()
+
+
+def get_pool_classes():
+    # the urllib3 pools of the sessions, their connections record the reuse
+    # of each request in _request_local. Called with _sessions_lock held.
+    from urllib3.connectionpool import HTTPConnectionPool, \
+        HTTPSConnectionPool
+
+    if not _pool_classes:
+        for scheme, pool_cls in (('http', HTTPConnectionPool),
+                                 ('https', HTTPSConnectionPool)):
+            _pool_classes[scheme] = type(
+                pool_cls.__name__, (pool_cls,),
+                dict(ConnectionCls=reuse_connection(pool_cls.ConnectionCls)))
+
+    return _pool_classes
+
+
+def reuse_connection(conn_cls):
+    class ReuseConnection(conn_cls):
+        # the socket of the previous request, a request on another socket
+        # (a new or a reconnected one) is not a reuse
+        used_sock = None
+
+        def request(self, *args, **kwargs):
+            _request_local.reused = self.sock is not None and \
+                self.sock is self.used_sock
+            try:
+                return super(ReuseConnection, self).request(*args, **kwargs)
+            finally:
+                self.used_sock = self.sock
+
+    return ReuseConnection
+
+
+# sessions = {session_key: requests.Session}
+# All PrestModule instances of one process talking to the same device share
+# a session, so the TCP/TLS connections are kept alive between REST calls.
+_sessions = dict()
+_sessions_lock = threading.Lock()
+
+
+def get_session(key, pool_size=DEFAULT_POOL_SIZE, keepalive=True,
+                max_retries=DEFAULT_MAX_RETRIES):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size,
+                                  max_retries=max_retries)
+            adapter.poolmanager.pool_classes_by_scheme = get_pool_classes()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.verify = False
+            if not keepalive:
+                session.headers['Connection'] = 'close'
+            _sessions[key] = session
+
+        return session
+
+
+# buckets = {device: TokenBucket}, shared like the sessions so that all the
+# threads sending to a device draw from the same bucket
+_buckets = dict()
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(key, rate):
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None or bucket.rate != rate:
+            bucket = _buckets[key] = TokenBucket(rate)
+
+        return bucket
+
+
+# rate requests per second, up to rate requests at once after an idle time
+class TokenBucket(object):
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst or max(1.0, self.rate)
+        self.tokens = self.burst
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # takes a token and returns the seconds to wait before using it
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens / self.rate
+
+
+class PrestTransportError(Exception):
+    # result = the fail_json() arguments other than msg
+    def __init__(self, msg, **result):
+        super(PrestTransportError, self).__init__(msg)
+        self.result = result
+
+
+# requests.Response look-alike of the responses of the httpapi connection
+class PrestResponse(object):
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = to_bytes(text)
+        self.headers = headers or dict()
+
+    def json(self):
+        return json.loads(self.text)
+
+
+# Response whose body is read in chunks by the caller
+# release(complete) gives the connection back to the transport once the
+# body is read, or closes it. An unread body is read to its end by close()
+# so that the keep-alive connection can be used again.
+class PrestStreamResponse(object):
+    def __init__(self, status_code, headers, chunks, release):
+        self.status_code = status_code
+        self.headers = headers or dict()
+        self.chunks = iter(chunks)
+        self.release = release
+        self.closed = False
+
+    def iter_chunks(self):
+        return self.chunks
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        complete = False
+        try:
+            for chunk in self.chunks:
+                pass
+            complete = True
+        except RETRY_ERRORS:
+            pass
+        finally:
+            self.release(complete)
+
+
+def iter_body(resp, chunk_size=STREAM_CHUNK_SIZE):
+    # the body of resp in chunks, the transports without streaming
+    # (asyncio, httpapi) return the whole body
+    if isinstance(resp, PrestStreamResponse):
+        return resp.iter_chunks()
+
+    content = resp.content or b''
+
+    return (content[idx:idx + chunk_size]
+            for idx in range(0, len(content), chunk_size))
+
 
 class PrestModule(object):
     def __init__(self, module):
         self.headers = {'Authorization': '',
                         'Content-Type': ''}
+        self.session = None
+        self.connection = None
+        self.async_transport = None
+        self.urls_transport = None
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+        self.max_retries = DEFAULT_MAX_RETRIES
+        self.retry_backoff = DEFAULT_RETRY_BACKOFF
+        self.bucket = None
+        self.conn_stats = dict(requests=0, new=0, reused=0, retries=0,
+                               throttled=0, throttle_wait=0)
+        self.stats_lock = threading.Lock()
+        # trace = [{request}, ...], None unless tracing
+        # phases = {phase: {'requests', 'elapsed', 'sent', 'received'}}
+        self.trace = None
+        self.phases = dict()
+        self.trace_start = time.time()
+        self.local = threading.local()
 
-        if not HAS_REQUESTS:
+        # only the requests transport needs the requests module
+        if module.params.get('transport') == 'requests' and \
+                not HAS_REQUESTS and not getattr(module, '_socket_path', None):
             module.fail_json(msg=missing_required_lib('requests'))
 
     def basic_auth(self, username, password):
-        return "Basic %s" % base64.b64encode(to_bytes(
-            "%s:%s" % (username, password), errors='surrogate_or_strict'))
+        return "Basic %s" % to_text(base64.b64encode(to_bytes(
+            "%s:%s" % (username, password), errors='surrogate_or_strict')))
 
     def set_headers(self, username, password):
         self.headers['Authorization'] = self.basic_auth(username, password)
         self.headers['Content-Type'] = 'application/json'
 
+    def set_session(self, key, pool_size=DEFAULT_POOL_SIZE, keepalive=True,
+                    max_retries=DEFAULT_MAX_RETRIES):
+        self.session = get_session(key, pool_size, keepalive, max_retries)
+
+    def set_connection(self, socket_path):
+        self.connection = Connection(socket_path)
+
+    def set_timeout(self, connect_timeout, read_timeout):
+        self.timeout = (connect_timeout, read_timeout)
+
+    def set_retries(self, max_retries, retry_backoff=DEFAULT_RETRY_BACKOFF):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def set_rate_limit(self, key, rate):
+        # rate = requests per second to the device, 0 for no limit
+        self.bucket = get_bucket(key, rate) if rate > 0 else None
+
+    def set_trace(self, enabled):
+        self.trace = list() if enabled else None
+
+    def set_phase(self, phase):
+        # phase of the requests of the thread, None for 'read' or 'write'
+        # by the method, returns the previous phase
+        previous = getattr(self.local, 'phase', None)
+        self.local.phase = phase
+
+        return previous
+
+    def record(self, method, url, data, resp, start, retries):
+        if self.trace is None:
+            return
+
+        phase = getattr(self.local, 'phase', None) or \
+            ('read' if method in ('GET', 'HEAD') else 'write')
+        entry = dict(method=method, path=path_template(url), phase=phase,
+                     status_code=None, sent=0, received=0, reused=None,
+                     retries=retries,
+                     start=round(start - self.trace_start, 6),
+                     elapsed=round(time.time() - start, 6))
+        if data is not None:
+            entry['sent'] = len(to_bytes(json.dumps(data)))
+        if resp is not None:
+            if isinstance(resp, PrestStreamResponse):
+                # the body is not read yet
+                received = int(resp.headers.get('Content-Length') or 0)
+            else:
+                received = len(resp.content)
+            entry.update(status_code=resp.status_code, received=received,
+                         reused=getattr(resp, 'reused', None))
+
+        with self.stats_lock:
+            self.trace.append(entry)
+            totals = self.phases.setdefault(
+                phase, dict(requests=0, elapsed=0, sent=0, received=0))
+            totals['requests'] += 1
+            totals['elapsed'] = round(totals['elapsed'] + entry['elapsed'],
+                                      6)
+            totals['sent'] += entry['sent']
+            totals['received'] += entry['received']
+
+    def throttle(self):
+        # seconds to wait for a token of the device
+        if self.bucket is None:
+            return 0
+
+        delay = self.bucket.reserve()
+        if delay > 0:
+            with self.stats_lock:
+                self.conn_stats['throttled'] += 1
+                self.conn_stats['throttle_wait'] = round(
+                    self.conn_stats['throttle_wait'] + delay, 6)
+
+        return delay
+
+    def should_retry(self, method, attempt, resp=None):
+        # resp is None after a connection error or a timeout
+        if method not in RETRY_METHODS or attempt >= self.max_retries:
+            return False
+
+        return resp is None or resp.status_code in RETRY_STATUS
+
+    def retry_delay(self, attempt, resp=None):
+        # Retry-After of the device, else exponential backoff with full jitter
+        if resp is not None:
+            retry_after = resp.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                return min(MAX_RETRY_BACKOFF, int(retry_after))
+
+        return random.uniform(0, min(MAX_RETRY_BACKOFF,
+                                     self.retry_backoff * (2 ** attempt)))
+
+    def request(self, method, url, data=None, headers=None, stream=False):
+        # stream=True returns a PrestStreamResponse with the requests and
+        # urls transports, the body is read with iter_body()
+        start = time.time()
+        attempt = 0
+        while True:
+            delay = self.throttle()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                resp = self.send(method, url, data, headers, stream)
+            except RETRY_ERRORS as e:
+                if not self.should_retry(method, attempt):
+                    self.record(method, url, data, None, start, attempt)
+                    raise PrestTransportError('%s %s failed: %s'
+                                              % (method, url, e))
+                resp = None
+            else:
+                if not self.should_retry(method, attempt, resp):
+                    self.record(method, url, data, resp, start, attempt)
+                    return resp
+                if isinstance(resp, PrestStreamResponse):
+                    resp.close()
+
+            with self.stats_lock:
+                self.conn_stats['retries'] += 1
+            time.sleep(self.retry_delay(attempt, resp))
+            attempt += 1
+
+    def send(self, method, url, data=None, headers=None, stream=False):
+        if self.connection is not None:
+            # url is the path on the persistent connection of the task host
+            status_code, text = self.connection.send_request(method, url,
+                                                             data,
+                                                             self.timeout)
+            with self.stats_lock:
+                self.conn_stats['requests'] += 1
+                self.conn_stats['reused'] += 1
+            resp = PrestResponse(status_code, text)
+            resp.reused = True
+            return resp
+
+        if headers is not None:
+            headers = dict(self.headers, **headers)
+        else:
+            headers = self.headers
+
+        if self.async_transport is not None:
+            # sent by the event loop thread, which updates conn_stats alone
+            return self.async_transport.request(method, url, data, headers,
+                                                self.conn_stats,
+                                                self.pool_size, self.timeout)
+
+        if self.urls_transport is not None:
+            resp = self.urls_transport.request(method, url, data, headers,
+                                               self.timeout, stream)
+            with self.stats_lock:
+                self.conn_stats['requests'] += 1
+                self.conn_stats['reused' if resp.reused else 'new'] += 1
+            return resp
+
+        if self.session is None:
+            self.set_session(url.split('/api/')[0])
+
+        _request_local.reused = False
+        resp = self.session.request(method, url, headers=headers,
+                                    json=data, verify=False,
+                                    timeout=self.timeout, stream=stream)
+
+        resp.reused = _request_local.reused
+        with self.stats_lock:
+            self.conn_stats['requests'] += 1
+            self.conn_stats['reused' if resp.reused else 'new'] += 1
+
+        if stream:
+            # the connection goes back to the pool once the body is read
+            stream_resp = PrestStreamResponse(
+                resp.status_code, resp.headers,
+                resp.iter_content(STREAM_CHUNK_SIZE),
+                lambda complete: resp.close())
+            stream_resp.reused = resp.reused
+            return stream_resp
+
+        return resp
+
     def get(self, url):
-        return requests.get(url, headers=self.headers, verify=False)
+        return self.request('GET', url)
+
+    def get_stream(self, url):
+        return self.request('GET', url, stream=True)
 
     def post(self, url, data):
-        return requests.post(url, headers=self.headers,
-                             json=data, verify=False)
+        return self.request('POST', url, data)
 
     def put(self, url, data):
-        return requests.put(url, headers=self.headers, json=data, verify=False)
+        return self.request('PUT', url, data)
 
     def delete(self, url, data):
-        return requests.delete(url, headers=self.headers,
-                               json=data, verify=False)
+        return self.request('DELETE', url, data)
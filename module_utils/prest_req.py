@@ -0,0 +1,190 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_utils import PrestUtils
+from ansible.module_utils.prest_utils import PrestUtils
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import CMD_APP_TYPE
+from ansible.module_utils.prest_module import CMD_APP_TYPE
+
+try:
+    #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_async import PrestAsyncReq
+    from ansible.module_utils.prest_async import PrestAsyncReq
+except SyntaxError:
+    # Python 2 has no async/await
+    PrestAsyncReq = object
+
+# one of them selects the applications of the pio_req_* modules
+req_app_options = ['app_name', 'app_names', 'app_pattern']
+
+# request inspection name: URL category of the request inspection
+req_type_dict = {
+    'sql': 'req-sql',
+    'xss': 'req-xss',
+    'buffer': 'req-buffer',
+    'tool': 'req-tool',
+    'appac': 'req-appac',
+}
+
+req_status_entry = dict(
+    status=dict(type='int', required=True, choices=[0, 1]),
+    block=dict(type='int', required=True, choices=[0, 1]),
+    log=dict(type='int', required=True, choices=[0, 1]),
+)
+
+
+# Request inspection status engine of the pio_req_* modules
+# req_name = None (the 'policy' option), 'sql', 'xss', 'buffer', 'tool', 'appac'
+class PrestReq(PrestUtils, PrestAsyncReq):
+    def __init__(self, module, req_name=None):
+        super(PrestReq, self).__init__(module)
+        self.req_name = req_name
+
+    def get_req_body(self):
+        return {'enable': self.module.params['status'],
+                'block': self.module.params['block'],
+                'log': self.module.params['log']}
+
+    def get_req_policy(self):
+        # {req_name: {'enable', 'block', 'log'}}
+        if self.req_name is not None:
+            return {self.req_name: self.get_req_body()}
+
+        policy = dict()
+        for req_name, entry in self.module.params['policy'].items():
+            if entry is None:
+                continue
+            policy[req_name] = {'enable': entry['status'],
+                                'block': entry['block'],
+                                'log': entry['log']}
+
+        return policy
+
+    def req_status_url(self, app_id, req_name=None):
+        return self.set_url(CMD_APP_TYPE,
+                            req_type_dict[req_name or self.req_name],
+                            'status', app_id, None)
+
+    def get_req_status(self, app_id, req_name=None):
+        url = self.req_status_url(app_id, req_name)
+
+        return self.find_status(self.decode(self.get(url)))
+
+    def find_status(self, resp_body):
+        # the {'enable', 'block', 'log'} entry of the status response
+        if not isinstance(resp_body, dict):
+            return None
+        if 'enable' in resp_body:
+            return resp_body
+
+        for key, value in resp_body.items():
+            if key == 'header':
+                continue
+            status = self.find_status(value)
+            if status is not None:
+                return status
+
+        return None
+
+    def is_same_status(self, status, body):
+        if status is None:
+            return False
+
+        for key, value in body.items():
+            if str(status.get(key)) != str(value):
+                return False
+
+        return True
+
+    def set_req_status(self, app_id, req_name=None, body=None):
+        url = self.req_status_url(app_id, req_name)
+
+        return self.put(url, body or self.get_req_body())
+
+    def set_app_policy(self, app):
+        # reads all the statuses of the application and writes only the
+        # request inspections that differ from the policy
+        app_name, app_id = app
+        policy = self.get_req_policy()
+        workers = self.module.params['workers']
+        req_names = sorted(policy.keys())
+
+        before = dict(zip(req_names, self.run_parallel(
+            lambda req_name: self.get_req_status(app_id, req_name),
+            req_names, workers)))
+        changes = [req_name for req_name in req_names
+                   if not self.is_same_status(before[req_name],
+                                              policy[req_name])]
+
+        def set_status(req_name):
+            resp, elapsed = self.timed(self.set_req_status, app_id,
+                                       req_name, policy[req_name])
+            req_result = self.parse_result(resp, app_id)
+            req_result.update(elapsed=elapsed)
+            return req_result
+
+        put_results = dict(zip(changes, self.run_parallel(set_status, changes,
+                                                          workers)))
+
+        return app_name, self.policy_result(app_id, policy, before,
+                                            put_results)
+
+    def policy_result(self, app_id, policy, before, put_results):
+        # {req_name: result} of the application, put_results are the
+        # results of the request inspections written
+        app_id = self.stale_ids.get(app_id, app_id)
+        app_result = dict()
+        for req_name in sorted(policy.keys()):
+            if req_name in put_results:
+                req_result = put_results[req_name]
+            else:
+                req_result = dict(message='Already configured',
+                                  changed=False, failed=False,
+                                  status_code=None, result_code=None,
+                                  elapsed=0)
+            req_result.update(app_id=app_id, before=before[req_name],
+                              after=policy[req_name])
+            app_result[req_name] = req_result
+
+        return app_result
+
+    def run(self):
+        if self.module.check_mode:
+            return self.result
+
+        app_name = self.module.params['app_name']
+        if app_name is not None:
+            app_ids = self.get_app_ids([app_name])
+        else:
+            app_ids = self.get_app_ids(self.module.params['app_names'],
+                                       self.module.params['app_pattern'])
+
+        if self.async_transport is not None:
+            app_results = self.run_async(self.aset_policies(app_ids))
+        else:
+            app_results = self.run_parallel(self.set_app_policy,
+                                            app_ids.items(),
+                                            self.module.params['workers'])
+
+        if self.req_name is None:
+            if app_name is not None:
+                self.result['policy'] = app_results[0][1]
+            else:
+                self.result['apps'] = dict(app_results)
+            self.aggregate_result([r for name, app_result in app_results
+                                   for r in app_result.values()])
+        elif app_name is not None:
+            req_result = app_results[0][1][self.req_name]
+            self.result['before'] = req_result['before']
+            self.result['after'] = req_result['after']
+            self.apply_result(req_result)
+        else:
+            self.result['apps'] = dict(
+                (name, app_result[self.req_name])
+                for name, app_result in app_results)
+            self.aggregate_result(list(self.result['apps'].values()))
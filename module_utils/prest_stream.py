@@ -0,0 +1,361 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import re
+import csv
+import json
+import codecs
+
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import has_module
+from ansible.module_utils.prest_module import has_module
+
+# yaml is imported by the first YAML file, every module reads its lists
+# with this module but few of them read YAML files
+yaml = None
+HAS_YAML = has_module('yaml')
+
+
+def load_yaml():
+    global yaml
+    if yaml is None:
+        import yaml
+
+
+CHUNK_SIZE = 65536
+JSON_WS = ' \t\r\n'
+JSON_DECODER = json.JSONDecoder()
+# decodes the value at an index, without the whitespace before it
+scan_once = JSON_DECODER.scan_once
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# the next string or bracket of an object or array
+STRUCTURE = re.compile(r'["{}\[\]]')
+# the end or the next escape of a string
+STRING_END = re.compile(r'["\\]')
+# the end of a number, true, false or null
+SCALAR_END = re.compile(r'[,}\] \t\n\r]')
+# a number is decoded up to the end of its chunk, 1 of 1.5 or 1e5, it is
+# complete only before one of VALUE_END
+NUMBER_START = '-0123456789'
+VALUE_END = JSON_WS + ',]}'
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    # yields the values of the top-level JSON array of f one at a time,
+    # only the value being decoded is kept in memory
+    decoder = json.JSONDecoder()
+    buf = ''
+    eof = False
+    expect = '['
+
+    while True:
+        buf = buf.lstrip(JSON_WS)
+        if not buf:
+            if eof:
+                raise ValueError('Unexpected end of the JSON array')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = chunk
+            continue
+
+        if expect == '[':
+            if buf[0] != '[':
+                raise ValueError('The JSON data is not an array')
+            buf = buf[1:]
+            expect = 'value'
+        elif buf[0] == ']':
+            return
+        elif expect == ',':
+            if buf[0] != ',':
+                raise ValueError('Invalid JSON array near: %s' % buf[:20])
+            buf = buf[1:]
+            expect = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buf)
+            except ValueError:
+                value, end = None, None
+            # the value may continue in the next chunk
+            if end is None or end == len(buf) or \
+                    buf[0] in NUMBER_START and buf[end] not in VALUE_END:
+                if eof:
+                    if end is None:
+                        raise ValueError('Invalid JSON array near: %s'
+                                         % buf[:20])
+                else:
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buf += chunk
+                    continue
+
+            yield value
+            buf = buf[end:]
+            expect = ','
+
+
+def iter_yaml_list(f):
+    # yields the items of the top-level YAML block sequence of f one at a
+    # time, every item starts with '- ' at the first column
+    lines = list()
+    for line in f:
+        if line.startswith('- ') or line.rstrip() == '-':
+            for item in load_yaml_item(lines):
+                yield item
+            lines = [line]
+        elif lines and not line.startswith('...'):
+            lines.append(line)
+
+    for item in load_yaml_item(lines):
+        yield item
+
+
+def load_yaml_item(lines):
+    if not lines:
+        return list()
+
+    return yaml.safe_load(''.join(lines)) or list()
+
+
+def iter_file_entries(path):
+    # yields the entries of a CSV (with a header row), JSON (array),
+    # JSON lines or YAML (list) file
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r') as f:
+        if ext == '.csv':
+            for entry in csv.DictReader(f):
+                yield entry
+        elif ext == '.json':
+            for entry in iter_json_array(f):
+                yield entry
+        elif ext == '.jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext in ('.yml', '.yaml'):
+            if not HAS_YAML:
+                raise ValueError('PyYAML is required to read %s' % path)
+            load_yaml()
+            for entry in iter_yaml_list(f):
+                yield entry
+        else:
+            raise ValueError('Unsupported file format: %s' % path)
+
+
+def iter_list_entries(chunks, list_name, entry_name):
+    # the entries of a {list_name: {entry_name: [entry, ...]}} body read
+    # from chunks (bytes or text), one at a time
+    return JsonListReader(chunks).iter_entries(list_name, entry_name)
+
+
+# Incremental reader of the list responses
+# Only the entry being decoded is kept with the chunk being read, the other
+# values are skipped without being decoded, so the memory does not grow
+# with the size of the list. The reader stops when the caller stops.
+class JsonListReader(object):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        # start of the value kept in buf, None when skipping
+        self.mark = None
+        self.eof = False
+
+    def fill(self):
+        # appends the next chunk to buf, False at the end of the body
+        if self.eof:
+            return False
+
+        cut = self.pos if self.mark is None else self.mark
+        if cut:
+            self.buf = self.buf[cut:]
+            self.pos -= cut
+            if self.mark is not None:
+                self.mark -= cut
+
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+            if chunk:
+                self.buf += chunk
+                return True
+
+        self.buf += self.decoder.decode(b'', True)
+        self.eof = True
+
+        return False
+
+    def peek(self):
+        # the next character after the whitespace, '' at the end of the body
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        # consumes the next character, one of chars
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expecting one of %r, got %r' % (chars, char))
+        self.pos += 1
+
+        return char
+
+    def scan_string(self):
+        # moves pos after the string starting at pos
+        self.pos += 1
+        while True:
+            match = STRING_END.search(self.buf, self.pos)
+            if match is None or match.end() == len(self.buf) and \
+                    match.group() == '\\':
+                # the escaped character is in the next chunk
+                self.pos = len(self.buf) if match is None else match.start()
+                if not self.fill():
+                    raise ValueError('Unterminated string')
+                continue
+            if match.group() == '"':
+                self.pos = match.end()
+                return
+            self.pos = match.end() + 1
+
+    def scan_value(self):
+        # moves pos after the value starting at pos, without decoding it
+        char = self.peek()
+        if char == '"':
+            self.scan_string()
+            return
+
+        if char and char in '{[':
+            depth = 0
+            while True:
+                match = STRUCTURE.search(self.buf, self.pos)
+                if match is None:
+                    self.pos = len(self.buf)
+                    if not self.fill():
+                        raise ValueError('Unterminated %r' % char)
+                    continue
+                if match.group() == '"':
+                    self.pos = match.start()
+                    self.scan_string()
+                    continue
+                self.pos = match.end()
+                if match.group() in '{[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return
+
+        # fill() moves the text of buf, the length is counted instead
+        length = 0
+        while True:
+            match = SCALAR_END.search(self.buf, self.pos)
+            end = len(self.buf) if match is None else match.start()
+            length += end - self.pos
+            self.pos = end
+            if match is not None or not self.fill():
+                break
+        if length == 0:
+            raise ValueError('Expecting a value, got %r' % char)
+
+    def read_value(self):
+        # the decoded value starting at pos
+        self.peek()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                end = None
+            if end is not None and (self.eof or end < len(self.buf) and (
+                    self.buf[self.pos] not in NUMBER_START or
+                    self.buf[end] in VALUE_END)):
+                self.pos = end
+                return value
+
+            # the value may continue in the next chunk
+            self.mark = self.pos
+            try:
+                self.fill()
+            finally:
+                self.mark = None
+
+    def find_key(self, name):
+        # moves pos to the value of name in the object starting at pos,
+        # False if it is not an object or has no such key
+        if self.peek() != '{':
+            return False
+        self.pos += 1
+        if self.peek() == '}':
+            return False
+
+        while True:
+            if self.peek() != '"':
+                raise ValueError('Expecting a key, got %r' % self.peek())
+            key = self.read_value()
+            self.expect(':')
+            if key == name:
+                return True
+            self.scan_value()
+            if self.expect(',}') == '}':
+                return False
+
+    def iter_entries(self, list_name, entry_name):
+        # entry_name is a list of entries, or a single entry (an object)
+        if not self.find_key(list_name) or not self.find_key(entry_name):
+            return
+
+        char = self.peek()
+        if char == '{':
+            yield self.read_value()
+            return
+        if char != '[':
+            return
+        self.pos += 1
+        if self.peek() == ']':
+            return
+
+        while True:
+            # the entries complete in buf are decoded by the scanner of the
+            # decoder, without the calls of peek() and expect(), the entry
+            # cut by the end of buf is read by read_value()
+            buf = self.buf
+            size = len(buf)
+            pos = self.pos
+            while pos < size:
+                if buf[pos] in JSON_WS:
+                    pos = WHITESPACE.match(buf, pos).end()
+                try:
+                    value, end = scan_once(buf, pos)
+                except (StopIteration, ValueError):
+                    break
+                if end < size and buf[end] in JSON_WS:
+                    end = WHITESPACE.match(buf, end).end()
+                if end >= size:
+                    break
+                char = buf[end]
+                if char == ',':
+                    pos = end + 1
+                    yield value
+                    continue
+                if char != ']':
+                    # a number cut by the end of the chunk, or an error
+                    # raised by read_value() and expect()
+                    break
+                self.pos = end + 1
+                yield value
+                return
+
+            self.pos = pos
+            yield self.read_value()
+            if self.expect(',]') == ']':
+                return
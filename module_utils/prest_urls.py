@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2019, Piolink Inc.
+# GNU General Public License v3.0 (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import ssl
+import json
+import socket
+import threading
+
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.module_utils.urls import Request
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import PrestResponse, \
+#    PrestStreamResponse, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, \
+#    DEFAULT_READ_TIMEOUT, STREAM_CHUNK_SIZE
+from ansible.module_utils.prest_module import PrestResponse, \
+    PrestStreamResponse, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, \
+    DEFAULT_READ_TIMEOUT, STREAM_CHUNK_SIZE
+
+# transports = {device: UrlsTransport}, shared like the requests sessions
+_transports = dict()
+_transports_lock = threading.Lock()
+
+
+def get_urls_transport(key, pool_size=DEFAULT_POOL_SIZE, keepalive=True):
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = UrlsTransport(pool_size,
+                                                         keepalive)
+
+        return transport
+
+
+# Transport without requests
+# urls.Request opens a connection per request, so the keep-alive connections
+# are kept as http_client connections, up to pool_size idle ones per device.
+class UrlsTransport(object):
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keepalive=True):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        # idle = [HTTP(S)Connection, ...]
+        self.idle = list()
+        self.lock = threading.Lock()
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    def request(self, method, url, data=None, headers=None, timeout=None,
+                stream=False):
+        # PrestResponse with reused = whether the connection was kept alive,
+        # PrestStreamResponse with stream unless keepalive is False
+        connect_timeout, read_timeout = timeout or (DEFAULT_CONNECT_TIMEOUT,
+                                                    DEFAULT_READ_TIMEOUT)
+        body = None
+        if data is not None:
+            body = to_bytes(json.dumps(data))
+        headers = dict((name, value)
+                       for name, value in (headers or dict()).items()
+                       if value)
+
+        if not self.keepalive:
+            return self.open_url(method, url, body, headers, read_timeout)
+
+        parts = urlsplit(url)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+
+        while True:
+            conn = None
+            with self.lock:
+                if self.idle:
+                    conn = self.idle.pop()
+            reused = conn is not None
+            if conn is None:
+                conn = self.connect(parts, connect_timeout)
+
+            try:
+                conn.sock.settimeout(read_timeout)
+                conn.request(method, target, body, headers)
+                resp = conn.getresponse()
+                content = None if stream else resp.read()
+            except (http_client.HTTPException, socket.error):
+                conn.close()
+                # the device closed the idle keep-alive connection
+                if reused:
+                    continue
+                raise
+            break
+
+        if stream:
+            stream_resp = PrestStreamResponse(
+                resp.status, dict(resp.getheaders()),
+                iter(lambda: resp.read(STREAM_CHUNK_SIZE), b''),
+                lambda complete: self.release(conn, resp, complete))
+            stream_resp.reused = reused
+            return stream_resp
+
+        self.release(conn, resp)
+
+        prest_resp = PrestResponse(resp.status, to_text(content),
+                                   dict(resp.getheaders()))
+        prest_resp.reused = reused
+
+        return prest_resp
+
+    def release(self, conn, resp, complete=True):
+        # keeps conn for the next request once the body of resp is read
+        with self.lock:
+            if not complete or resp.will_close or \
+                    len(self.idle) >= self.pool_size:
+                conn.close()
+            else:
+                self.idle.append(conn)
+
+    def connect(self, parts, connect_timeout):
+        if parts.scheme == 'https':
+            conn = http_client.HTTPSConnection(parts.hostname, parts.port,
+                                               timeout=connect_timeout,
+                                               context=self.ssl_context)
+        else:
+            conn = http_client.HTTPConnection(parts.hostname, parts.port,
+                                              timeout=connect_timeout)
+        conn.connect()
+
+        return conn
+
+    def open_url(self, method, url, body, headers, read_timeout):
+        # keepalive=False, one urls.Request per request
+        try:
+            resp = Request().open(method, url, data=body, headers=headers,
+                                  validate_certs=False, timeout=read_timeout)
+        except HTTPError as e:
+            # the 4xx and 5xx responses are returned to the module
+            resp = e
+
+        prest_resp = PrestResponse(resp.getcode(), to_text(resp.read()),
+                                   dict(resp.info().items()))
+        prest_resp.reused = False
+
+        return prest_resp
@@ -10,30 +10,213 @@ __metaclass__ = type
 import os
 import re
 import ast
+import json
+import time
+import fnmatch
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 try:
-    import requests
-    HAS_REQUESTS = True
+    import orjson
+    HAS_ORJSON = True
 except ImportError:
-    HAS_REQUESTS = False
+    HAS_ORJSON = False
+try:
+    from concurrent.futures import ThreadPoolExecutor
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
 
+from ansible.module_utils._text import to_bytes
 #from ansible.module_utils.network.piolink.prest_module import PrestModule,\
 #    CMD_SITE_TYPE, CMD_APP_TYPE, CMD_AMSS_TYPE
 #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_module import PrestModule, \
 #    CMD_SITE_TYPE, CMD_APP_TYPE, CMD_AMSS_TYPE
 from ansible.module_utils.prest_module import PrestModule, \
-    CMD_SITE_TYPE, CMD_APP_TYPE, CMD_AMSS_TYPE
-from ansible.module_utils.basic import missing_required_lib
+    PrestTransportError, PrestStreamResponse, iter_body, HAS_REQUESTS, \
+    CMD_SITE_TYPE, CMD_APP_TYPE, CMD_AMSS_TYPE, DEFAULT_POOL_SIZE, \
+    DEFAULT_MAX_RETRIES, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, \
+    DEFAULT_RETRY_BACKOFF, TRACE_ENV
+from ansible.module_utils.prest_cache import PrestCache, \
+    PrestConnectionCache, DEFAULT_CACHE_TTL, DEFAULT_CACHE_DIR
+#from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_stream import iter_list_entries
+from ansible.module_utils.prest_stream import iter_list_entries
+try:
+    #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_async import PrestAsyncUtils, \
+    #    get_async_transport, HAS_ASYNCIO, DEFAULT_MAX_CONCURRENCY
+    from ansible.module_utils.prest_async import PrestAsyncUtils, \
+        get_async_transport, HAS_ASYNCIO, DEFAULT_MAX_CONCURRENCY
+except SyntaxError:
+    # Python 2 has no async/await
+    PrestAsyncUtils = object
+    HAS_ASYNCIO = False
+    DEFAULT_MAX_CONCURRENCY = 100
+
+DEFAULT_WORKERS = 10
+
+# connection options shared by all of the pio_* modules
+prest_argument_spec = dict(
+    pool_size=dict(type='int', default=DEFAULT_POOL_SIZE),
+    keepalive=dict(type='bool', default=True),
+    max_retries=dict(type='int', default=DEFAULT_MAX_RETRIES),
+    retry_backoff=dict(type='float', default=DEFAULT_RETRY_BACKOFF),
+    connect_timeout=dict(type='float', default=DEFAULT_CONNECT_TIMEOUT),
+    read_timeout=dict(type='float', default=DEFAULT_READ_TIMEOUT),
+    rate_limit=dict(type='float', default=0),
+    app_cache_ttl=dict(type='int', default=DEFAULT_CACHE_TTL),
+    cache_dir=dict(type='path', default=DEFAULT_CACHE_DIR),
+    hosts=dict(type='list', elements='str'),
+    max_parallel=dict(type='int', default=DEFAULT_WORKERS),
+    trace=dict(type='bool', default=False),
+    transport=dict(type='str', choices=['requests', 'urls', 'asyncio']),
+    max_concurrency=dict(type='int', default=DEFAULT_MAX_CONCURRENCY),
+)
+
+# option of the modules planning their writes with run_plan()
+plan_argument_spec = dict(
+    plan_file=dict(type='path'),
+)
+
+# plan_file = {'version', 'module', 'devices': {device URL: {'digest',
+# 'time', 'apps', 'steps'}}}, one plan per device of 'hosts'
+PLAN_VERSION = 2
+
+# one of them selects the WEBFRONT-K devices of the pio_* modules
+device_options = ['host', 'hosts']
+
+# required unless the task uses the httpapi connection
+connection_options = ['host', 'port', 'username', 'password']
+
+NO_ITEM = 'no item'
+
+
+def json_loads(data):
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+# serializes the devices of 'hosts' writing their plan in the same file
+_plan_lock = threading.Lock()
+
+# marks the worker threads of run_parallel(), fail_json() would only end
+# the worker, so PrestUtils.fail_request() raises there
+_worker_local = threading.local()
+
+
+def run_parallel(func, items, workers=DEFAULT_WORKERS):
+    # returns [func(item), ...] in the order of items, the first exception
+    # of func is raised once all of the workers are done
+    items = list(items)
+    if not HAS_FUTURES or workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
 
+    def run_worker(item):
+        _worker_local.active = True
+        try:
+            return func(item)
+        finally:
+            _worker_local.active = False
 
-class PrestUtils(PrestModule):
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(run_worker, items))
+
+
+class PrestDeviceError(Exception):
+    pass
+
+
+# AnsibleModule of one of the devices of the 'hosts' option
+class PrestDeviceModule(object):
+    def __init__(self, module, host, port):
+        self.module = module
+        self.params = dict(module.params)
+        self.params.update(host=host, port=port, hosts=None)
+        self._socket_path = None
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def fail_json(self, **kwargs):
+        raise PrestDeviceError(kwargs)
+
+    def exit_json(self, **kwargs):
+        raise PrestDeviceError(dict(kwargs, msg='exit_json is not allowed '
+                                    'for a device of hosts'))
+
+
+def run_devices(cls, module):
+    # runs the cls module on every device of 'hosts' concurrently and exits
+    # with result = {'devices': {device: device result}}
+    def run_device(device):
+        host, sep, port = device.partition(':')
+        device_module = PrestDeviceModule(module, host,
+                                          port or module.params['port'])
+        try:
+            prest = cls(device_module)
+            prest.init_args()
+            prest.run()
+            return device, prest.build_result()
+        except PrestDeviceError as e:
+            return device, dict(e.args[0], failed=True)
+        except PrestTransportError as e:
+            return device, dict(e.result, msg=str(e), failed=True)
+        except Exception as e:
+            return device, dict(msg=str(e), failed=True)
+
+    device_results = run_parallel(run_device, module.params['hosts'],
+                                  module.params['max_parallel'])
+
+    changed = [d for d, r in device_results if r.get('changed')]
+    failed = [d for d, r in device_results if r.get('failed')]
+    result = dict(changed=bool(changed), failed=bool(failed),
+                  devices=dict(device_results),
+                  message='%d devices: %d changed, %d failed'
+                  % (len(device_results), len(changed), len(failed)))
+
+    # the facts of the devices, {'<name>_devices': {device: value}}, since
+    # only the ansible_facts of the task result are set on the host
+    facts = dict()
+    for device, device_result in device_results:
+        for name, value in (device_result.pop('ansible_facts', None)
+                            or dict()).items():
+            facts.setdefault(name + '_devices', dict())[device] = value
+    if facts:
+        result['ansible_facts'] = facts
+    module.exit_json(**result)
+
+
+class PrestUtils(PrestModule, PrestAsyncUtils):
     def __init__(self, module):
         super(PrestUtils, self).__init__(module)
 
-        if not HAS_REQUESTS:
-            module.fail_json(msg=missing_required_lib('requests'))
+        if module.params.get('transport') == 'asyncio' and not HAS_ASYNCIO:
+            module.fail_json(msg="transport=asyncio requires Python 3")
 
         self.module = module
         self.resp = None
+        self.app_cache = None
+        # cached_apps = {app_id: app_name} of the app_ids read from the cache
+        self.cached_apps = dict()
+        # stale_ids = {stale cached app_id: app_id read from the device}
+        self.stale_ids = dict()
+        self.cached_apps_lock = threading.Lock()
+        self.aggregated = False
+        # steps = [{'method', 'path', 'body'}, ...] of the plan, the path
+        # is relative to prefix_url
+        self.steps = list()
+        # planned_apps = {app_id placeholder: app_name} of the applications
+        # created by the plan
+        self.planned_apps = OrderedDict()
+        # planned_ids = {app_id placeholder: app_id} once they are created
+        self.planned_ids = dict()
+        # lists = {url: [entry, ...]}
+        self.lists = dict()
+        # indexes = {(url, key): {key value: entry}}
+        self.indexes = dict()
         self.p = re.compile('(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
                             '\\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
                             '\\.(25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)'
@@ -51,6 +234,24 @@ class PrestUtils(PrestModule):
         self.result = result
 
     def init_args(self):
+        self.set_trace(self.module.params['trace'] or
+                       os.environ.get(TRACE_ENV, '').lower() in
+                       ('1', 'true', 'yes', 'on'))
+        self.set_retries(self.module.params['max_retries'],
+                         self.module.params['retry_backoff'])
+        self.set_timeout(self.module.params['connect_timeout'],
+                         self.module.params['read_timeout'])
+
+        if getattr(self.module, '_socket_path', None):
+            self.init_connection()
+            return
+
+        missing = [name for name in connection_options
+                   if self.module.params[name] is None]
+        if missing:
+            self.module.fail_json(msg="missing required arguments: %s"
+                                  % ', '.join(missing))
+
         # set prefix url
         self.prefix_url = 'https://{0}:{1}/api/v2'.format(
             self.module.params['host'], self.module.params['port'])
@@ -59,24 +260,238 @@ class PrestUtils(PrestModule):
         self.set_headers(self.module.params['username'],
                          self.module.params['password'])
 
-    def get_entry(self, url, key, value, list_name, entry_name):
-        self.resp = self.get(url)
-        if self.resp is None:
-            return None
-        elif "no item" in self.resp.text or "null" in self.resp.text:
+        # set keep-alive session
+        self.pool_size = self.module.params['pool_size']
+        transport = self.get_transport()
+        if transport == 'asyncio':
+            self.async_transport = get_async_transport(
+                self.module.params['max_concurrency'],
+                self.module.params['keepalive'])
+        elif transport == 'urls':
+            # imported only by the tasks using it, like requests
+            #from ansible_collections.sikim_piolink.wfktest.plugins.module_utils.prest_urls import \
+            #    get_urls_transport
+            from ansible.module_utils.prest_urls import get_urls_transport
+            self.urls_transport = get_urls_transport(
+                self.prefix_url, self.module.params['pool_size'],
+                self.module.params['keepalive'])
+        else:
+            # the requests are retried by request(), not by urllib3
+            self.set_session(self.prefix_url,
+                             self.module.params['pool_size'],
+                             self.module.params['keepalive'])
+        self.set_rate_limit(self.prefix_url, self.module.params['rate_limit'])
+
+        # set app_id cache
+        if self.module.params['app_cache_ttl'] > 0:
+            self.app_cache = PrestCache(self.module.params['cache_dir'],
+                                        self.prefix_url, 'app_id',
+                                        self.module.params['app_cache_ttl'])
+
+    def get_transport(self):
+        # requests when it is installed, else ansible.module_utils.urls
+        transport = self.module.params['transport']
+        if transport is None:
+            transport = 'requests' if HAS_REQUESTS else 'urls'
+
+        return transport
+
+    def init_connection(self):
+        # connection: httpapi, the connection process keeps the session,
+        # the authentication and the app_id cache between the tasks
+        self.prefix_url = '/api/v2'
+        self.set_connection(self.module._socket_path)
+        if self.module.params['rate_limit'] > 0:
+            self.set_rate_limit(self.get_device(),
+                                self.module.params['rate_limit'])
+
+        if self.module.params['app_cache_ttl'] > 0:
+            self.app_cache = PrestConnectionCache(
+                self.connection, 'app_id',
+                self.module.params['app_cache_ttl'])
+
+    def get_device(self):
+        # URL of the device, the key of the controller-side caches
+        if self.connection is not None:
+            return self.connection.get_device_url()
+
+        return self.prefix_url
+
+    def iter_entries(self, url, list_name, entry_name):
+        # the entries of the list one at a time, streamed from the response
+        # body unless get_entries() fetched the list, the response is
+        # closed when the caller stops
+        if url in self.lists:
+            for entry in self.lists[url]:
+                yield entry
+            return
+        if self.is_planned_url(url):
+            return
+
+        # a failed read is not an empty list, the writes planned from it
+        # would rewrite every entry
+        resp = self.get_stream(url)
+        try:
+            if resp.status_code >= 400:
+                self.fail_request('GET %s failed: HTTP %d'
+                                  % (url, resp.status_code),
+                                  status_code=resp.status_code)
+            for entry in iter_list_entries(iter_body(resp), list_name,
+                                           entry_name):
+                yield entry
+        except ValueError as e:
+            self.fail_request('GET %s failed: invalid list body: %s'
+                              % (url, e))
+        finally:
+            if isinstance(resp, PrestStreamResponse):
+                resp.close()
+
+    def request(self, method, url, data=None, headers=None, stream=False):
+        # the URLs of a stale cached app_id go to the app_id read from the
+        # device, a 404 of a cached app_id is sent once again with it
+        app_id = self.get_url_app_id(url)
+        if app_id in self.stale_ids:
+            app_id = self.stale_ids[app_id]
+            url = self.set_url_app_id(url, app_id)
+
+        try:
+            resp = super(PrestUtils, self).request(method, url, data,
+                                                   headers, stream)
+            if resp.status_code != 404 or app_id is None:
+                return resp
+
+            new_id = self.resolve_stale_app_id(app_id)
+            if new_id is None or new_id == app_id:
+                return resp
+            if isinstance(resp, PrestStreamResponse):
+                resp.close()
+            url = self.set_url_app_id(url, new_id)
+            resp = super(PrestUtils, self).request(method, url, data,
+                                                   headers, stream)
+        except PrestTransportError as e:
+            self.fail_request(str(e), **e.result)
+
+        if resp.status_code == 404:
+            self.fail_request("%s %s failed: HTTP 404 with the app_id read "
+                              "again for the stale cached app_id %s"
+                              % (method, url, app_id))
+
+        return resp
+
+    def fail_request(self, msg, **result):
+        # fail_json() in the main thread, the workers of run_parallel()
+        # raise PrestTransportError so that the module exits only once
+        if getattr(_worker_local, 'active', False):
+            raise PrestTransportError(msg, **result)
+        self.module.fail_json(msg=msg, **result)
+
+    def run_parallel(self, func, items, workers=DEFAULT_WORKERS):
+        # run_parallel() failing the module once all of the workers are done
+        try:
+            return run_parallel(func, items, workers)
+        except PrestTransportError as e:
+            self.fail_request(str(e), **e.result)
+
+    def get_url_app_id(self, url):
+        # the app_id of an application URL, None for the other URLs
+        app_url = os.path.join(self.prefix_url, CMD_APP_TYPE, '')
+        if not url.startswith(app_url):
             return None
 
-        resp_body = self.strdict_to_dict(self.resp.text)
-        data = resp_body[list_name][entry_name]
-        if isinstance(data, list):
-            for idx in range(0, len(data)):
-                if data[idx][key] == value:
-                    return data[idx]
+        return url[len(app_url):].split('/')[0]
+
+    def set_url_app_id(self, url, app_id):
+        app_url = os.path.join(self.prefix_url, CMD_APP_TYPE, '')
+        parts = url[len(app_url):].split('/', 1)
+        parts[0] = app_id
+
+        return app_url + '/'.join(parts)
+
+    def get_entries(self, url, list_name, entry_name):
+        # fetch the list once per run, decoded entry by entry from the
+        # response body, the lists of a planned application are empty
+        if url not in self.lists:
+            self.lists[url] = list(self.iter_entries(url, list_name,
+                                                     entry_name))
+
+        return self.lists[url]
+
+    def get_index(self, url, key, list_name, entry_name):
+        # answer the lookups by key from the list fetched once
+        if (url, key) in self.indexes:
+            return self.indexes[(url, key)]
+
+        index = dict()
+        for entry in self.get_entries(url, list_name, entry_name):
+            if key in entry:
+                index.setdefault(entry[key], entry)
+        self.indexes[(url, key)] = index
+
+        return index
+
+    def get_sig_status(self, sig_class, app_id):
+        # {sig_id: sig_status} of sig_class, from the catalog for all the
+        # applications (app_id '0') or from the settings of app_id
+        if app_id == '0':
+            url = self.set_url(CMD_SITE_TYPE, 'paf_sig_base', sig_class,
+                               None, None)
         else:
-            if data[key] == value:
-                return data
+            url = self.set_url(CMD_SITE_TYPE, 'paf_sig_settle', sig_class,
+                               None, None)
+
+        # only the status is kept, not the signatures
+        sig_status = dict()
+        for entry in self.iter_entries(url, sig_class, 'sig_entry'):
+            if app_id == '0' or str(entry.get('app_id')) == app_id:
+                sig_status[str(entry.get('sig_id'))] = \
+                    str(entry.get('sig_status'))
+
+        return sig_status
+
+    def forget_list(self, url):
+        # the list is fetched again on the next lookup
+        self.lists.pop(url, None)
+        for index_key in list(self.indexes.keys()):
+            if index_key[0] == url:
+                del self.indexes[index_key]
+
+    def get_list(self, resp_body, list_name, entry_name):
+        # {list_name: {entry_name: [entry, ...]}} or None if there is no item
+        if not isinstance(resp_body, dict):
+            return None
+
+        list_body = resp_body.get(list_name)
+        if not isinstance(list_body, dict):
+            return None
+
+        return list_body.get(entry_name)
+
+    def decode(self, resp):
+        if resp is None:
+            return None
+
+        try:
+            return json_loads(resp.content)
+        except ValueError:
+            pass
+
+        # not a valid JSON body
+        try:
+            return self.strdict_to_dict(resp.text)
+        except (ValueError, SyntaxError):
+            return None
 
-        return None
+    def is_no_item(self, resp_body):
+        if resp_body is None:
+            return True
+        if not isinstance(resp_body, dict):
+            return NO_ITEM in str(resp_body)
+
+        header = resp_body.get('header')
+        if isinstance(header, dict):
+            return NO_ITEM in str(header.get('resultMessage', ''))
+
+        return False
 
     def set_url(self, cmd_type, cate, func, app_id, key):
         if cmd_type == CMD_SITE_TYPE or cmd_type == CMD_AMSS_TYPE:
@@ -98,40 +513,383 @@ class PrestUtils(PrestModule):
 
         return ast.literal_eval(_str_dic)
 
-    def set_result(self):
-        if self.resp is None or "no item" in self.resp.text:
-            self.result['message'] = 'Prest request Failed'
+    def parse_result(self, resp, app_id=None):
+        # {'message', 'changed', 'failed', 'status_code', 'result_code'}
+        resp_result = dict(message='', changed=False, failed=False,
+                           status_code=None, result_code=None)
+        if resp is not None:
+            resp_result['status_code'] = resp.status_code
+
+        resp_body = self.decode(resp)
+        if self.is_no_item(resp_body):
+            self.invalidate_app_id(app_id)
+            resp_result['message'] = 'Prest request Failed'
         else:
-            resp_body = self.strdict_to_dict(self.resp.text)
-            if 'header' in resp_body.keys():
-                self.result['message'] = resp_body['header']['resultMessage']
-                if resp_body['header']['resultCode'] > 0:
-                    self.result['changed'] = True
-                if resp_body['header']['resultCode'] < 0:
-                    self.result['failed'] = True
+            if isinstance(resp_body, dict) and 'header' in resp_body.keys():
+                result_code = resp_body['header']['resultCode']
+                resp_result['message'] = resp_body['header']['resultMessage']
+                resp_result['result_code'] = result_code
+                if result_code > 0:
+                    resp_result['changed'] = True
+                if result_code < 0:
+                    resp_result['failed'] = True
             else:
-                self.result['message'] = str(resp_body)
-        self.module.exit_json(**self.result)
+                resp_result['message'] = str(resp_body)
+
+        return resp_result
+
+    def aggregate_result(self, results):
+        # results = [parse_result(), ...] of the requests of the run
+        changed = [r for r in results if r['changed']]
+        failed = [r for r in results if r['failed']]
+        if changed:
+            self.result['changed'] = True
+        if failed:
+            self.result['failed'] = True
+        self.result['message'] = '%d requests: %d changed, %d failed' \
+            % (len(results), len(changed), len(failed))
+        self.aggregated = True
+
+    def set_result(self):
+        self.module.exit_json(**self.build_result())
 
-    def get_app_id(self):
-        app_id = ''
+    def apply_result(self, resp_result):
+        # resp_result = parse_result() of the request of the run
+        self.result['message'] = resp_result['message']
+        if resp_result['changed']:
+            self.result['changed'] = True
+        if resp_result['failed']:
+            self.result['failed'] = True
+        self.aggregated = True
 
-        if self.module.params['app_name'].lower() == 'all':
-            app_id = '0'
+    def build_result(self):
+        if not self.aggregated:
+            self.apply_result(self.parse_result(self.resp))
+        self.result['connection'] = self.conn_stats
+        if self.app_cache is not None:
+            self.result['app_cache'] = self.app_cache.stats()
+        if self.trace is not None:
+            self.result['trace'] = dict(device=self.get_device(),
+                                        requests=self.trace,
+                                        phases=self.phases)
+
+        return self.result
+
+    def run_plan(self):
+        # plan() reads the device and lists the writes, apply_plan() sends
+        # them. The check mode returns the plan, saved in plan_file if
+        # given, and plan_file is applied without reading the device again.
+        plan_file = self.module.params.get('plan_file')
+        if plan_file is not None and not self.module.check_mode:
+            self.load_plan(plan_file)
         else:
+            self.plan()
+            if plan_file is not None:
+                self.save_plan(plan_file)
+
+        if self.module.check_mode:
+            self.result['plan'] = self.steps
+            self.result['changed'] = bool(self.steps)
+            self.result['message'] = '%d planned writes' % len(self.steps)
+            self.aggregated = True
+            return
+
+        self.apply_plan()
+
+    def plan(self):
+        # reads the device and adds the writes with add_step(), overridden
+        # by the modules using run_plan()
+        pass
+
+    def add_step(self, method, url, body=None, group=None, **info):
+        # the steps of a group are sent in order, the groups concurrently,
+        # info is kept in the step for the result of the module
+        self.steps.append(self.make_step(method, url, body, group, **info))
+
+    def make_step(self, method, url, body=None, group=None, **info):
+        # a step for apply_step(), sent without being planned
+        step = dict(info, method=method, body=body,
+                    path=url[len(self.prefix_url):].lstrip('/'))
+        if group is not None:
+            step['group'] = group
+
+        return step
+
+    def plan_app(self, url, app_name):
+        # plans the creation of app_name, returns its placeholder app_id
+        placeholder = '{app_id:%d}' % len(self.planned_apps)
+        self.planned_apps[placeholder] = app_name
+        self.add_step('POST', url, {'name': app_name}, app_name,
+                      app_name=app_name)
+
+        return placeholder
+
+    def is_planned_url(self, url):
+        for placeholder in self.planned_apps.keys():
+            if placeholder in url:
+                return True
+
+        return False
+
+    def resolve_step(self, step):
+        # (URL, body) of the step with the app_id of the created applications
+        path = step['path']
+        body = step['body']
+        if self.planned_ids:
+            text = json.dumps(body)
+            for placeholder, app_id in self.planned_ids.items():
+                path = path.replace(placeholder, app_id)
+                text = text.replace(placeholder, app_id)
+            body = json.loads(text)
+
+        return os.path.join(self.prefix_url, path), body
+
+    def apply_step(self, step):
+        url, body = self.resolve_step(step)
+        self.resp = self.request(step['method'], url, body)
+
+        return self.parse_result(self.resp)
+
+    def apply_steps(self, steps):
+        # returns [(step, parse_result()), ...]
+        # The applications are created first, their app_ids are read with
+        # one app-list fetch, then the groups are sent concurrently.
+        workers = self.module.params.get('workers') or 1
+        url = self.set_url(CMD_SITE_TYPE, 'site-app', 'app-list', None, None)
+        path = url[len(self.prefix_url):].lstrip('/')
+
+        creations = [step for step in steps
+                     if step['method'] == 'POST' and step['path'] == path]
+        step_results = list(zip(creations, self.run_parallel(
+            self.apply_step, creations, workers)))
+        if creations:
+            self.forget_list(url)
+        if self.planned_apps:
+            app_ids = self.get_app_ids(list(self.planned_apps.values()))
+            self.planned_ids = dict(
+                (placeholder, app_ids[app_name])
+                for placeholder, app_name in self.planned_apps.items())
+
+        # groups = {group: [step, ...]}, the steps without a group in one
+        groups = OrderedDict()
+        for step in steps:
+            if step['method'] != 'POST' or step['path'] != path:
+                groups.setdefault(step.get('group'), list()).append(step)
+
+        for group_results in self.run_parallel(
+                lambda group: [(step, self.apply_step(step))
+                               for step in group],
+                groups.values(), workers):
+            step_results.extend(group_results)
+
+        return step_results
+
+    def apply_plan(self):
+        # sends the writes of the plan
+        if not self.steps:
+            self.result['message'] = 'Already configured'
+            self.aggregated = True
+            return
+
+        self.aggregate_result([step_result for step, step_result
+                               in self.apply_steps(self.steps)])
+
+    def plan_digest(self):
+        # digest of the options the plan is made from
+        options = set(prest_argument_spec.keys()) | \
+            set(plan_argument_spec.keys()) | set(connection_options)
+        params = dict((name, value)
+                      for name, value in self.module.params.items()
+                      if name not in options)
+
+        return hashlib.sha1(to_bytes(json.dumps(
+            params, sort_keys=True))).hexdigest()
+
+    def read_plan(self, plan_file):
+        with open(plan_file, 'r') as f:
+            plan = json.load(f, object_pairs_hook=OrderedDict)
+        if not isinstance(plan, dict) or \
+                plan.get('version') != PLAN_VERSION or \
+                plan.get('module') != type(self).__name__:
+            return None
+
+        return plan
+
+    def save_plan(self, plan_file):
+        # the plan of this device replaces its previous one, the plans of
+        # the other devices of the file are kept
+        device_plan = dict(digest=self.plan_digest(), time=time.time(),
+                           apps=self.planned_apps, steps=self.steps)
+
+        # a partial plan is never left behind
+        directory = os.path.dirname(os.path.abspath(plan_file))
+        with _plan_lock:
+            try:
+                plan = self.read_plan(plan_file)
+            except (IOError, OSError, ValueError):
+                plan = None
+            if plan is None:
+                plan = dict(version=PLAN_VERSION, module=type(self).__name__,
+                            devices=dict())
+            plan['devices'][self.get_device()] = device_plan
+
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                                prefix='.tmp-')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(plan, f, indent=1)
+                os.rename(tmp_path, plan_file)
+            except (IOError, OSError) as e:
+                self.module.fail_json(msg="Failed to write the plan_file: %s"
+                                      % e)
+
+    def load_plan(self, plan_file):
+        try:
+            plan = self.read_plan(plan_file)
+        except (IOError, OSError, ValueError) as e:
+            self.module.fail_json(msg="Failed to read the plan_file, run the "
+                                  "task in check mode to write it: %s" % e)
+
+        if plan is None:
+            self.module.fail_json(msg="%s is not a plan of this module"
+                                  % plan_file)
+        device_plan = plan['devices'].get(self.get_device())
+        if device_plan is None:
+            self.module.fail_json(msg="%s has no plan of %s, run the task in "
+                                  "check mode to write it"
+                                  % (plan_file, self.get_device()))
+        if device_plan.get('digest') != self.plan_digest():
+            self.module.fail_json(msg="%s was planned with other options"
+                                  % plan_file)
+
+        self.planned_apps = device_plan['apps']
+        self.steps = device_plan['steps']
+
+    def get_app_id(self, create=True):
+        app_name = self.module.params['app_name']
+
+        return self.get_app_ids([app_name], create=create)[app_name]
+
+    def get_app_ids(self, app_names=None, app_pattern=None, create=True):
+        # the requests are traced in the 'app_id' phase
+        previous = self.set_phase('app_id')
+        try:
+            return self.resolve_app_ids(app_names, app_pattern, create)
+        finally:
+            self.set_phase(previous)
+
+    def resolve_app_ids(self, app_names=None, app_pattern=None, create=True):
+        # {app_name: app_id} resolved from a single app-list fetch, the
+        # missing applications get a placeholder app_id and a planned
+        # creation unless create
+        app_ids = OrderedDict()
+        names = list()
+        for app_name in app_names or list():
+            if app_name.lower() == 'all':
+                app_ids[app_name] = '0'
+            elif app_name not in names:
+                names.append(app_name)
+
+        if self.app_cache is not None and app_pattern is None:
+            # the cache is read once for all of the names
+            cached = self.app_cache.get_many(names)
+            for app_name in list(names):
+                app_id = cached.get(app_name)
+                if app_id is not None:
+                    with self.cached_apps_lock:
+                        self.cached_apps[app_id] = app_name
+                    app_ids[app_name] = app_id
+                    names.remove(app_name)
+        if not names and app_pattern is None:
+            return app_ids
+
+        url = self.set_url(CMD_SITE_TYPE, 'site-app', 'app-list',
+                           None, None)
+        app_index = self.get_index(url, 'name', 'app_list', 'app_entry')
+        if app_pattern is not None:
+            for app_name in sorted(app_index.keys()):
+                if fnmatch.fnmatchcase(app_name, app_pattern) and \
+                        app_name not in names:
+                    names.append(app_name)
+
+        # create the missing applications and read the list once again
+        missing = [app_name for app_name in names
+                   if app_name not in app_index]
+        # planned = {app_name: placeholder app_id}
+        planned = dict()
+        if missing and not create:
+            for app_name in missing:
+                planned[app_name] = self.plan_app(url, app_name)
+        elif missing:
+            for app_name in missing:
+                self.resp = self.post(url, {'name': app_name})
+            self.forget_list(url)
+            app_index = self.get_index(url, 'name', 'app_list', 'app_entry')
+
+        # read_ids = {app_name: app_id}, written to the cache at once
+        read_ids = dict()
+        for app_name in names:
+            if app_name in planned:
+                app_ids[app_name] = planned[app_name]
+                continue
+            if app_name not in app_index:
+                self.module.fail_json(msg="Failed to create the application: %s"
+                                      % app_name)
+            app_ids[app_name] = read_ids[app_name] = \
+                app_index[app_name]['app_id']
+        if self.app_cache is not None:
+            self.app_cache.set_many(read_ids)
+
+        return app_ids
+
+    def invalidate_app_id(self, app_id=None):
+        # the cached app_id is gone from the device
+        with self.cached_apps_lock:
+            for cached_id in list(self.cached_apps.keys()):
+                if app_id is None or cached_id == app_id:
+                    app_name = self.cached_apps.pop(cached_id, None)
+                    if app_name is not None:
+                        self.app_cache.delete(app_name)
+
+    def resolve_stale_app_id(self, app_id):
+        # the app_id of the application of the cached app_id answered with a
+        # 404, read from the device, None if app_id is not a cached one.
+        # Raises PrestTransportError, it also runs in the asyncio workers.
+        with self.cached_apps_lock:
+            if app_id in self.stale_ids:
+                return self.stale_ids[app_id]
+            app_name = self.cached_apps.pop(app_id, None)
+            if app_name is None:
+                return None
+            self.app_cache.delete(app_name)
+
             url = self.set_url(CMD_SITE_TYPE, 'site-app', 'app-list',
                                None, None)
-            app = self.get_entry(url, 'name', self.module.params['app_name'],
-                                 'app_list', 'app_entry')
-            if app is None:
-                body = {'name': self.module.params['app_name']}
-                self.resp = self.post(url, body)
-                app = self.get_entry(url, 'name',
-                                     self.module.params['app_name'],
-                                     'app_list', 'app_entry')
-            app_id = app['app_id']
-
-        return app_id
+            self.forget_list(url)
+            resp = super(PrestUtils, self).request('GET', url)
+            entries = self.get_list(self.decode(resp), 'app_list',
+                                    'app_entry')
+            if isinstance(entries, dict):
+                entries = [entries]
+            for entry in entries or list():
+                if isinstance(entry, dict) and entry.get('name') == app_name:
+                    break
+            else:
+                raise PrestTransportError(
+                    "The application %s of the cached app_id %s is gone "
+                    "from the device" % (app_name, app_id))
+
+            self.stale_ids[app_id] = str(entry['app_id'])
+            self.app_cache.set(app_name, self.stale_ids[app_id])
+
+            return self.stale_ids[app_id]
+
+    def timed(self, func, *args):
+        # returns (func(*args), elapsed seconds)
+        start = time.time()
+        ret = func(*args)
+
+        return ret, round(time.time() - start, 6)
 
     def validate_ip(self, ip):
         match = self.p.match(ip)
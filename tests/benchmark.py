@@ -0,0 +1,542 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Benchmark of the PrestUtils hot paths and of the run() of the modules on
+# synthetic WEBFRONT-K data, answered by the tests/prest_server.py state
+# without the network.
+#
+#   python tests/benchmark.py [--apps 10000] [--sig-count 50000] \
+#       [--ip-count 5000] [--output result.json] \
+#       [--baseline previous.json --threshold 0.25]
+#
+# The run fails (exit code 1) when a timing is slower than the baseline by
+# more than the threshold, or a peak RSS is larger by more than it.
+#
+# peak_rss is the memory (KiB) a new interpreter needs above its imports to
+# find the last signature of a sig_count signature class: decoded as a
+# whole (decode, strdict_to_dict) or streamed from the body (iter_entries),
+# and above the stand-in state to run pio_user_sig_up on that class
+# (run.pio_user_sig_up).
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    # Windows
+    HAS_RESOURCE = False
+
+import ansible.module_utils
+
+# load the role's module_utils as ansible.module_utils.*
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROLE_DIR = os.path.dirname(TESTS_DIR)
+ansible.module_utils.__path__.append(os.path.join(ROLE_DIR, 'module_utils'))
+sys.path.insert(0, TESTS_DIR)
+
+from ansible.module_utils.prest_utils import PrestUtils  # noqa: E402
+from ansible.module_utils.prest_cache import PrestCache  # noqa: E402
+from ansible.module_utils.prest_module import \
+    STREAM_CHUNK_SIZE  # noqa: E402
+from ansible.module_utils.prest_stream import \
+    iter_list_entries  # noqa: E402
+from prest_server import WfkHandler, WfkState, NotFound, \
+    result_body, parse_args as server_args  # noqa: E402
+
+STUB_URL = 'https://stub:443/api/v2'
+
+
+class BenchModule(object):
+    def __init__(self, params=None):
+        # StubTransport replaces send(), the asyncio transport is chosen so
+        # that requests is not needed
+        self.params = params or dict(transport='asyncio')
+        self.check_mode = False
+
+    def fail_json(self, **kwargs):
+        raise RuntimeError(kwargs.get('msg'))
+
+    def exit_json(self, **kwargs):
+        pass
+
+
+class BenchResponse(object):
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = status_code
+        self.headers = headers or dict()
+
+    def json(self):
+        return json.loads(self.text)
+
+
+# PrestModule.send() answered by the request handler of the stand-in server
+class StubTransport(object):
+    def __init__(self, state):
+        self.handler = WfkHandler.__new__(WfkHandler)
+        self.handler.state = state
+        self.handler.options = server_args(['--quiet'])
+
+    def send(self, method, url, data=None, headers=None, stream=False):
+        # the body is in memory, read in chunks by iter_body() with stream
+        parts = url.split('/api/v2/', 1)[1].strip('/').split('/')
+        self.handler.headers = headers or dict()
+        # the body goes through JSON like on the wire
+        if data is not None:
+            data = json.loads(json.dumps(data))
+        try:
+            status_code, body, resp_headers = self.handler.route(
+                method, parts, data)
+        except NotFound:
+            status_code, body, resp_headers = 404, result_body(-1, 'no item'), \
+                None
+
+        return BenchResponse(json.dumps(body) if body is not None else '',
+                             status_code, resp_headers)
+
+
+def load_module(name):
+    # library/<name>.py as a python module
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(ROLE_DIR, 'library', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def stub_prest(cls, state, params=None):
+    # cls instance sending its requests to state
+    prest = cls(BenchModule(params))
+    prest.prefix_url = STUB_URL
+    prest.set_headers('admin', 'admin')
+    prest.send = StubTransport(state).send
+    if prest.module.params.get('app_cache_ttl'):
+        # the app_id cache of init_args()
+        prest.app_cache = PrestCache(prest.module.params['cache_dir'],
+                                     STUB_URL, 'app_id',
+                                     prest.module.params['app_cache_ttl'])
+
+    return prest
+
+
+def module_params(module, **params):
+    # default values of the module options with the given ones
+    result = dict((name, spec.get('default'))
+                  for name, spec in module.module_args.items())
+    result.update(host='stub', port='443', username='admin',
+                  password='admin', app_cache_ttl=0, transport='asyncio')
+    result.update(params)
+
+    return result
+
+
+def sig_base_body(sig_class, count):
+    state = WfkState(0)
+    state.fill_sig_class(sig_class, count)
+
+    return json.dumps(result_body(**{sig_class: {'sig_entry': list(
+        state.sig_base[sig_class].values())}}))
+
+
+def app_list_body(count):
+    state = WfkState(0)
+    state.fill_apps(count)
+
+    return json.dumps(result_body(app_list={'app_entry': list(
+        state.apps.values())}))
+
+
+def best_of(func, repeat, setup=None):
+    # fastest of repeat runs of func(setup()), setup is not timed
+    times = list()
+    for idx in range(0, repeat):
+        arg = setup() if setup is not None else None
+        start = timeit.default_timer()
+        func(arg)
+        times.append(timeit.default_timer() - start)
+
+    return min(times)
+
+
+def bench_hot_paths(args):
+    prest = PrestUtils(BenchModule())
+    prest.prefix_url = STUB_URL
+    timings = dict()
+
+    resp = BenchResponse(sig_base_body('sig_req_sql', args.sig_count))
+    timings['strdict_to_dict'] = best_of(
+        lambda arg: prest.strdict_to_dict(resp.text), args.repeat)
+    timings['decode'] = best_of(lambda arg: prest.decode(resp), args.repeat)
+    last_sig = '1106%05d' % (args.sig_count - 1)
+    timings['iter_entries'] = best_of(
+        lambda arg: find_entry(iter_list_entries(
+            chunks_of(resp.content), 'sig_req_sql', 'sig_entry'),
+            'sig_id', last_sig), args.repeat)
+
+    app_list = BenchResponse(app_list_body(args.apps))
+    prest.get_stream = lambda url: app_list
+    url = prest.set_url('site', 'site-app', 'app-list', None, None)
+    last_app = 'app%d' % (args.apps - 1)
+
+    def app_lookup(arg):
+        # get_app_ids() reads the application list once per run
+        prest.forget_list(url)
+        return prest.get_index(url, 'name', 'app_list',
+                               'app_entry')[last_app]
+
+    timings['get_index'] = best_of(app_lookup, args.repeat)
+
+    app_ids = [str(idx) for idx in range(0, args.apps)]
+    timings['set_url'] = best_of(
+        lambda arg: [prest.set_url('app', 'app-gen', 'ip-list', app_id, None)
+                     for app_id in app_ids], args.repeat)
+
+    ips = ['10.%d.%d.%d' % (idx // 65536, idx // 256 % 256, idx % 256)
+           for idx in range(0, args.ip_count)]
+    timings['validate_ip_port'] = best_of(
+        lambda arg: [prest.validate_ip(ip) and prest.validate_port('8080')
+                     for ip in ips], args.repeat)
+
+    pio_sig_up = load_module('pio_sig_up')
+    sig_list = [{'sig_id': '1106%05d' % idx, 'sig_status': '2'}
+                for idx in range(0, args.sig_count)]
+    sig = stub_prest(pio_sig_up.PioSigUp, WfkState(0),
+                     module_params(pio_sig_up, app_name='ALL',
+                                   sig_list=sig_list))
+    timings['sig_up_set_sig'] = best_of(lambda arg: sig.set_sig('0'),
+                                        args.repeat)
+
+    return timings
+
+
+def chunks_of(content):
+    return (content[idx:idx + STREAM_CHUNK_SIZE]
+            for idx in range(0, len(content), STREAM_CHUNK_SIZE))
+
+
+def check_chunk_boundaries():
+    # the entries streamed in chunks of every size are the decoded ones,
+    # the scalars cut by a chunk end included (1. and 5 of 1.5)
+    entries = [1.5, -20, 3e5, 2.5e-3, 0, True, None, 'a, b]',
+               {'sig_id': '1', 'count': 12.75}, [1, 2.5]]
+    for separators in ((', ', ': '), (',', ':')):
+        content = json.dumps(result_body(sig_x={'sig_entry': entries}),
+                             separators=separators).encode('utf-8')
+        for size in range(1, len(content) + 1):
+            chunks = [content[idx:idx + size]
+                      for idx in range(0, len(content), size)]
+            decoded = list(iter_list_entries(chunks, 'sig_x', 'sig_entry'))
+            if decoded != entries:
+                raise RuntimeError('iter_entries decoded %r from chunks of '
+                                   '%d bytes' % (decoded, size))
+
+
+def find_entry(entries, key, value):
+    for entry in entries:
+        if entry.get(key) == value:
+            return entry
+
+    return None
+
+
+def max_rss():
+    # peak resident memory of the process in KiB, VmHWM on Linux since
+    # ru_maxrss keeps the peak of the parent across fork and exec
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    return rss
+
+
+def user_sig_list(sig_count):
+    # the user signatures of pio_user_sig_up, half of them in the catalog
+    return [{'sig_content': 'sig_req_sql.+test%d' % (idx * 2),
+             'sig_status': '2', 'sig_type': '0',
+             'sig_ko_desc': 'user %d' % idx}
+            for idx in range(0, min(1000, sig_count))]
+
+
+def rss_child(name, path, sig_count):
+    # KiB above the imports to find the last signature of the body in path,
+    # or to run the module on the stand-in state, run by a new interpreter
+    # for each name
+    if name == 'run.pio_user_sig_up':
+        state = WfkState(0)
+        state.fill_sig_class('sig_req_sql', sig_count)
+        module = load_module('pio_user_sig_up')
+        prest = stub_prest(module.PioUserSigUp, state, module_params(
+            module, app_name='ALL', sig_class='sig_req_sql',
+            sig_list=user_sig_list(sig_count)))
+        start = max_rss()
+        prest.run()
+        return max_rss() - start
+
+    prest = PrestUtils(BenchModule())
+    last_sig = '1106%05d' % (sig_count - 1)
+    start = max_rss()
+
+    if name == 'iter_entries':
+        with open(path, 'rb') as f:
+            entry = find_entry(iter_list_entries(
+                iter(lambda: f.read(STREAM_CHUNK_SIZE), b''),
+                'sig_req_sql', 'sig_entry'), 'sig_id', last_sig)
+    else:
+        with open(path, 'rb') as f:
+            resp = BenchResponse(f.read().decode('utf-8'))
+        if name == 'decode':
+            body = prest.decode(resp)
+        else:
+            body = prest.strdict_to_dict(resp.text)
+        entry = find_entry(prest.get_list(body, 'sig_req_sql', 'sig_entry'),
+                           'sig_id', last_sig)
+
+    if entry is None:
+        raise RuntimeError('%s did not find %s' % (name, last_sig))
+
+    return max_rss() - start
+
+
+def bench_peak_rss(args):
+    # {name: KiB} measured by a new interpreter for each name
+    names = [name for name in ('decode', 'strdict_to_dict', 'iter_entries',
+                               'run.pio_user_sig_up')
+             if not args.only or re.search(args.only, name)]
+    if not HAS_RESOURCE or not names:
+        return dict()
+
+    fd, path = tempfile.mkstemp(prefix='wfk-bench-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(sig_base_body('sig_req_sql', args.sig_count))
+
+        peak_rss = dict()
+        for name in names:
+            out = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__), '--sig-count',
+                str(args.sig_count), '--rss-child', name, path])
+            peak_rss[name] = int(out.decode('utf-8').strip())
+    finally:
+        os.remove(path)
+
+    return peak_rss
+
+
+def bench_modules(args):
+    # (name, module, class name, params, state setup) of each run()
+    cache_dir = tempfile.mkdtemp(prefix='wfk-bench-')
+    app_name = 'app%d' % (args.apps - 1)
+
+    def apps_state():
+        state = WfkState(0)
+        state.fill_apps(args.apps)
+        return state
+
+    def app_state():
+        # the last application with half of the IPs of the run
+        state = apps_state()
+        app_id = str(args.apps)
+        state.app_lists[(app_id, 'ip-list')] = dict(
+            (ip['app_ip'], {'ip': ip['app_ip'], 'port': ip['app_port']})
+            for ip in ip_list[::2])
+        return state
+
+    def sig_state():
+        state = apps_state()
+        state.fill_sig_class('sig_req_sql', args.sig_count)
+        return state
+
+    def catalog_state():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return sig_state()
+
+    def facts_state():
+        # pio_facts reads every list of every application, req_apps of them
+        state = WfkState(0)
+        state.fill_apps(args.req_apps)
+        state.fill_sig_class('sig_req_sql', args.sig_count)
+        return state
+
+    ip_list = [{'app_ip': '10.%d.%d.%d' % (idx // 65536, idx // 256 % 256,
+                                           idx % 256),
+                'app_port': '80'} for idx in range(0, args.ip_count)]
+    sig_list = [{'sig_id': '1106%05d' % idx, 'sig_status': '2'}
+                for idx in range(0, args.sig_count)]
+    policy = dict((req_name, dict(status=1, block=1, log=1))
+                  for req_name in ('sql', 'xss', 'buffer', 'tool', 'appac'))
+
+    req_params = dict(
+        app_names=['app%d' % idx for idx in range(0, args.req_apps)],
+        status=1, block=1, log=1)
+
+    runs = [
+        ('pio_app', 'PioApp', dict(app_name=app_name, app_ip_list=ip_list,
+                                   app_domain_list=[]), app_state),
+        ('pio_req_sql', 'PioReqSql', req_params, apps_state),
+        ('pio_req_xss', 'PioReqXss', req_params, apps_state),
+        ('pio_req_buffer', 'PioReqBuffer', req_params, apps_state),
+        ('pio_req_tool', 'PioReqTool', req_params, apps_state),
+        ('pio_req_appac', 'PioReqAppac', req_params, apps_state),
+        ('pio_req_policy', 'PioReqPolicy',
+         dict(app_name=app_name, policy=policy), apps_state),
+        ('pio_sig_up', 'PioSigUp', dict(app_name='ALL', sig_list=sig_list),
+         sig_state),
+        ('pio_user_sig_up', 'PioUserSigUp',
+         dict(app_name='ALL', sig_class='sig_req_sql',
+              sig_list=user_sig_list(args.sig_count)), sig_state),
+        ('pio_sig_catalog', 'PioSigCatalog',
+         dict(sig_classes=['sig_req_sql'], cache_dir=cache_dir),
+         catalog_state),
+        ('pio_facts', 'PioFacts', dict(), facts_state),
+    ]
+
+    timings = dict()
+    try:
+        for name, cls_name, params, setup in runs:
+            if args.only and not re.search(args.only, name):
+                continue
+            module = load_module(name)
+            cls = getattr(module, cls_name)
+            params = module_params(module, **params)
+            timings['run.' + name] = best_of(
+                lambda state: stub_prest(cls, state, params).run(),
+                args.repeat, setup)
+
+        # the app_ids of all of the applications, without the app_id cache,
+        # with an empty one (written) and with a full one (read)
+        if not args.only or re.search(args.only, 'get_app_ids'):
+            app_names = ['app%d' % idx for idx in range(0, args.apps)]
+            state = apps_state()
+            for name, ttl, setup in (
+                    ('get_app_ids', 0, None),
+                    ('get_app_ids.cache_cold', 300,
+                     lambda: shutil.rmtree(cache_dir, ignore_errors=True)),
+                    ('get_app_ids.cache_warm', 300, None)):
+                params = dict(app_cache_ttl=ttl, cache_dir=cache_dir)
+                timings[name] = best_of(
+                    lambda arg: stub_prest(PrestUtils, state,
+                                           params).get_app_ids(app_names),
+                    args.repeat, setup)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return timings
+
+
+def compare(values, baseline, threshold, minimum):
+    # [(name, baseline value, value), ...] larger than the threshold allows,
+    # the values below minimum are not compared
+    regressions = list()
+    for name, value in sorted(values.items()):
+        before = baseline.get(name)
+        if before is None or max(before, value) < minimum:
+            continue
+        if value > before * (1 + threshold):
+            regressions.append((name, before, value))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--apps', type=int, default=10000)
+    parser.add_argument('--sig-count', type=int, default=50000)
+    parser.add_argument('--ip-count', type=int, default=5000)
+    parser.add_argument('--req-apps', type=int, default=100,
+                        help='applications configured by pio_req_sql')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='regex of the benchmarks to run')
+    parser.add_argument('--output', help='JSON file of the result')
+    parser.add_argument('--baseline', help='JSON result to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown from the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-time', type=float, default=0.005,
+                        help='timings below these seconds are not compared')
+    parser.add_argument('--min-rss', type=int, default=1024,
+                        help='peak RSS below these KiB are not compared')
+    parser.add_argument('--rss-child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_child:
+        print(rss_child(args.rss_child[0], args.rss_child[1],
+                        args.sig_count))
+        return
+
+    check_chunk_boundaries()
+
+    timings = dict()
+    for name, seconds in bench_hot_paths(args).items():
+        if not args.only or re.search(args.only, name):
+            timings[name] = seconds
+    timings.update(bench_modules(args))
+    peak_rss = bench_peak_rss(args)
+
+    result = {'sizes': {'apps': args.apps, 'sig_count': args.sig_count,
+                        'ip_count': args.ip_count,
+                        'req_apps': args.req_apps},
+              'timings': dict((name, round(seconds, 6))
+                              for name, seconds in timings.items()),
+              'peak_rss': peak_rss}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('sizes') != result['sizes']:
+            print('warning: the baseline was measured with other sizes: %s'
+                  % baseline.get('sizes'), file=sys.stderr)
+        regressions = compare(timings, baseline.get('timings', dict()),
+                              args.threshold, args.min_time)
+        rss_regressions = compare(peak_rss, baseline.get('peak_rss', dict()),
+                                  args.threshold, args.min_rss)
+        result['regressions'] = dict(
+            (name, {'baseline': before, 'current': round(seconds, 6)})
+            for name, before, seconds in regressions)
+        result['regressions'].update(
+            ('peak_rss.' + name, {'baseline': before, 'current': kib})
+            for name, before, kib in rss_regressions)
+        for name, before, seconds in regressions:
+            print('regression: %s %.6fs -> %.6fs (+%.0f%%)'
+                  % (name, before, seconds, (seconds / before - 1) * 100),
+                  file=sys.stderr)
+        for name, before, kib in rss_regressions:
+            print('regression: peak_rss.%s %dKiB -> %dKiB (+%.0f%%)'
+                  % (name, before, kib, (kib / before - 1) * 100),
+                  file=sys.stderr)
+        if regressions or rss_regressions:
+            status = 1
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Stand-in WEBFRONT-K REST server keeping the configuration in memory, for
+# offline tests and benchmarks of the pio_* modules.
+#
+#   python tests/prest_server.py --port 8443 \
+#       --certfile cert.pem --keyfile key.pem \
+#       [--latency 0.01] [--error-rate 0.01] [--sig-count 1000]
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import base64
+import json
+import random
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PREFIX = '/api/v2/'
+
+# sig_id prefix of each signature class, see module_utils/prest_catalog.py
+SIG_CLASSES = {
+    'sig_req_appac': '1101',
+    'sig_req_buffer': '1105',
+    'sig_req_sql': '1106',
+    'sig_req_xss': '1107',
+    'sig_req_upload': '1111',
+    'sig_req_download': '1112',
+    'sig_req_include': '1114',
+    'sig_req_tool': '1115',
+    'sig_req_uploadfile': '1116',
+    'sig_req_sqllogin': '1117',
+    'sig_req_filter': '1118',
+    'sig_req_url': '1201',
+}
+
+REQ_TYPES = ['req-sql', 'req-xss', 'req-buffer', 'req-tool', 'req-appac']
+
+# app-gen list name: key of the entries
+APP_LISTS = {
+    'ip-list': 'ip',
+    'domain-list': 'domain',
+}
+
+
+class NotFound(Exception):
+    pass
+
+
+# configuration of the device
+class WfkState(object):
+    def __init__(self, sig_count=100):
+        self.lock = threading.Lock()
+        # apps = {app_id: {'app_id', 'name'}}
+        self.apps = OrderedDict()
+        self.next_app_id = 1
+        # app_lists = {(app_id, 'ip-list'): OrderedDict(key: entry)}
+        self.app_lists = dict()
+        # req_status = {(app_id, req_type): {'enable', 'block', 'log'}}
+        self.req_status = dict()
+        # sig_base = {sig_class: OrderedDict(sig_id: entry)}
+        self.sig_base = dict()
+        # sig_settle = {(sig_class, app_id): {sig_id: sig_status}}
+        self.sig_settle = dict()
+        # sig_version = {sig_class: version}, the ETag of the class
+        self.sig_version = dict()
+
+        for sig_class in SIG_CLASSES.keys():
+            self.fill_sig_class(sig_class, sig_count)
+
+    def fill_sig_class(self, sig_class, count):
+        # replaces the catalog of sig_class with count signatures
+        entries = OrderedDict()
+        for idx in range(0, count):
+            sig_id = '%s%05d' % (SIG_CLASSES[sig_class], idx)
+            entries[sig_id] = {'sig_id': sig_id,
+                               'sig_content': '%s.+test%d' % (sig_class, idx),
+                               'sig_status': '1',
+                               'sig_type': '0',
+                               'sig_ko_desc': 'signature %d' % idx,
+                               'user_define': False,
+                               'app_id': None}
+        self.sig_base[sig_class] = entries
+        self.sig_version[sig_class] = self.sig_version.get(sig_class, 0) + 1
+
+    def fill_apps(self, count, prefix='app'):
+        # adds count applications named prefix0, prefix1, ...
+        for idx in range(0, count):
+            app_id = str(self.next_app_id)
+            self.next_app_id += 1
+            self.apps[app_id] = {'app_id': app_id,
+                                 'name': '%s%d' % (prefix, idx)}
+
+    def get_app(self, app_id):
+        if app_id not in self.apps:
+            raise NotFound(app_id)
+
+        return self.apps[app_id]
+
+    def add_app(self, name):
+        for app in self.apps.values():
+            if app['name'] == name:
+                return 0
+        app_id = str(self.next_app_id)
+        self.next_app_id += 1
+        self.apps[app_id] = {'app_id': app_id, 'name': name}
+
+        return 1
+
+    def delete_app(self, app_id):
+        self.get_app(app_id)
+        del self.apps[app_id]
+        for key in list(self.app_lists.keys()) + \
+                list(self.req_status.keys()):
+            if key[0] == app_id:
+                self.app_lists.pop(key, None)
+                self.req_status.pop(key, None)
+
+        return 1
+
+
+def result_body(result_code=0, message='success', **body):
+    body['header'] = {'resultCode': result_code, 'resultMessage': message}
+
+    return body
+
+
+class WfkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are written separately
+    disable_nagle_algorithm = True
+
+    # set by make_server()
+    state = None
+    options = None
+
+    def log_message(self, format, *args):
+        if not self.options.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def reply(self, status_code, body=None, headers=None):
+        data = b''
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        auth = '%s:%s' % (self.options.username, self.options.password)
+        expected = 'Basic %s' % base64.b64encode(
+            auth.encode('utf-8')).decode('ascii')
+
+        return self.headers.get('Authorization') == expected
+
+    def dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = None
+        if length:
+            try:
+                data = json.loads(self.rfile.read(length).decode('utf-8'))
+            except ValueError:
+                return self.reply(400, result_body(-1, 'invalid json'))
+
+        if self.options.latency > 0:
+            time.sleep(self.options.latency)
+        if not self.authorized():
+            return self.reply(401, result_body(-1, 'unauthorized'),
+                              {'WWW-Authenticate': 'Basic realm="wfk"'})
+        if random.random() < self.options.error_rate:
+            return self.reply(503, result_body(-1, 'busy'),
+                              {'Retry-After': '0'})
+        if not self.path.startswith(API_PREFIX):
+            return self.reply(404, result_body(-1, 'no item'))
+
+        parts = self.path[len(API_PREFIX):].split('?')[0].strip('/')
+        try:
+            with self.state.lock:
+                status_code, body, headers = self.route(
+                    method, parts.split('/'), data)
+        except NotFound:
+            status_code, body, headers = 404, result_body(-1, 'no item'), None
+        except (KeyError, TypeError, ValueError) as e:
+            status_code, body, headers = 400, result_body(-1, str(e)), None
+
+        self.reply(status_code, body, headers)
+
+    def route(self, method, parts, data):
+        # returns (status code, body, headers)
+        if parts[:3] == ['site', 'site-app', 'app-list']:
+            return self.app_list(method, parts[3:], data)
+        if parts[0] == 'app' and len(parts) >= 4:
+            self.state.get_app(parts[1])
+            if parts[2] == 'app-gen' and parts[3] in APP_LISTS:
+                return self.app_gen(method, parts[1], parts[3], parts[4:],
+                                    data)
+            if parts[2] in REQ_TYPES and parts[3] == 'status':
+                return self.req_status(method, parts[1], parts[2], data)
+        if parts[0] == 'site' and len(parts) == 3 and \
+                parts[2] in SIG_CLASSES:
+            if parts[1] == 'paf_sig_base':
+                return self.sig_base(method, parts[2], data)
+            if parts[1] == 'paf_sig_settle':
+                return self.sig_settle(method, parts[2], data)
+
+        raise NotFound(parts)
+
+    def entry_list(self, list_name, entry_name, entries, headers=None):
+        if not entries:
+            return 200, result_body(0, 'no item'), headers
+
+        return 200, result_body(**{list_name: {entry_name: entries}}), \
+            headers
+
+    def app_list(self, method, keys, data):
+        state = self.state
+        if method == 'GET':
+            return self.entry_list('app_list', 'app_entry',
+                                   list(state.apps.values()))
+        if method == 'POST':
+            return 200, result_body(state.add_app(data['name'])), None
+        if method == 'DELETE':
+            app_id = keys[0] if keys else data['app_id']
+            return 200, result_body(state.delete_app(app_id)), None
+
+        return 405, result_body(-1, 'method not allowed'), None
+
+    def app_gen(self, method, app_id, list_type, keys, data):
+        key_name = APP_LISTS[list_type]
+        entries = self.state.app_lists.setdefault((app_id, list_type),
+                                                  OrderedDict())
+        if method == 'GET':
+            return self.entry_list(list_type.replace('-', '_'),
+                                   key_name + '_entry',
+                                   list(entries.values()))
+        if method == 'POST':
+            if entries.get(data[key_name]) == data:
+                return 200, result_body(0), None
+            entries[data[key_name]] = data
+            return 200, result_body(1), None
+        if method == 'DELETE':
+            key = keys[0] if keys else data[key_name]
+            if entries.pop(key, None) is None:
+                raise NotFound(key)
+            return 200, result_body(1), None
+
+        return 405, result_body(-1, 'method not allowed'), None
+
+    def req_status(self, method, app_id, req_type, data):
+        status = self.state.req_status.setdefault(
+            (app_id, req_type), {'enable': 0, 'block': 0, 'log': 0})
+        if method == 'GET':
+            return 200, result_body(status=dict(status)), None
+        if method == 'PUT':
+            before = dict(status)
+            for key in ('enable', 'block', 'log'):
+                if key in data:
+                    status[key] = int(data[key])
+            return 200, result_body(int(status != before)), None
+
+        return 405, result_body(-1, 'method not allowed'), None
+
+    def sig_base(self, method, sig_class, data):
+        state = self.state
+        entries = state.sig_base[sig_class]
+        etag = '"%s-%d"' % (sig_class, state.sig_version[sig_class])
+        if method == 'GET':
+            if self.headers.get('If-None-Match') == etag:
+                return 304, None, {'ETag': etag}
+            return self.entry_list(sig_class, 'sig_entry',
+                                   list(entries.values()), {'ETag': etag})
+
+        changed = 0
+        if method == 'POST':
+            for entry in data['sig_entry']:
+                sig_id = '%s%05d' % (SIG_CLASSES[sig_class],
+                                     90000 + len(entries))
+                entries[sig_id] = dict(entry, sig_id=sig_id,
+                                       user_define=True, app_id=None)
+                changed = 1
+        elif method == 'PUT':
+            for entry in data['sig_entry']:
+                sig_id = str(entry['sig_id'])
+                if sig_id not in entries:
+                    return 200, result_body(-1, 'invalid sig_id: %s'
+                                            % sig_id), None
+                updated = dict(entries[sig_id], **entry)
+                if updated != entries[sig_id]:
+                    entries[sig_id] = updated
+                    changed = 1
+        else:
+            return 405, result_body(-1, 'method not allowed'), None
+
+        if changed:
+            state.sig_version[sig_class] += 1
+
+        return 200, result_body(changed), None
+
+    def sig_settle(self, method, sig_class, data):
+        state = self.state
+        if method == 'GET':
+            entries = list()
+            for (settle_class, app_id), status in state.sig_settle.items():
+                if settle_class == sig_class:
+                    entries.extend({'sig_id': sig_id, 'sig_status': value,
+                                    'app_id': app_id}
+                                   for sig_id, value in status.items())
+            return self.entry_list(sig_class, 'sig_entry', entries)
+        if method != 'PUT':
+            return 405, result_body(-1, 'method not allowed'), None
+
+        changed = 0
+        for entry in data['sig_entry']:
+            sig_id = str(entry['sig_id'])
+            if sig_id not in state.sig_base[sig_class]:
+                return 200, result_body(-1, 'invalid sig_id: %s'
+                                        % sig_id), None
+            app_id = str(entry.get('app_id'))
+            state.get_app(app_id)
+            status = state.sig_settle.setdefault((sig_class, app_id),
+                                                 dict())
+            if status.get(sig_id) != str(entry['sig_status']):
+                status[sig_id] = str(entry['sig_status'])
+                changed = 1
+
+        return 200, result_body(changed), None
+
+
+def make_server(host='127.0.0.1', port=0, options=None, state=None):
+    # options = parse_args() values, the defaults of main() if None
+    if options is None:
+        options = parse_args([])
+    handler = type('WfkStateHandler', (WfkHandler,),
+                   dict(state=state or WfkState(options.sig_count),
+                        options=options))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    if options.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(options.certfile, options.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+
+    return server
+
+
+def start_server(host='127.0.0.1', port=0, options=None, state=None):
+    # runs the server in a thread, returns (server, 'http(s)://host:port')
+    server = make_server(host, port, options, state)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    scheme = 'https' if server.socket.__class__.__name__ == 'SSLSocket' \
+        else 'http'
+
+    return server, '%s://%s:%d' % (scheme, host, server.server_address[1])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--certfile',
+                        help='certificate of the HTTPS server, '
+                             'the modules only use HTTPS')
+    parser.add_argument('--keyfile')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests answered with 503')
+    parser.add_argument('--sig-count', type=int, default=100,
+                        help='signatures of each signature class')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--quiet', action='store_true')
+
+    return parser.parse_args(argv)
+
+
+def main():
+    options = parse_args()
+    if options.seed is not None:
+        random.seed(options.seed)
+
+    server = make_server(options.host, options.port, options)
+    print('WEBFRONT-K stand-in listening on %s:%d'
+          % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
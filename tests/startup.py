@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright: (c) 2019, Piolink Inc.
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Startup time and payload size of the modules per transport.
+#
+#   python tests/startup.py [--repeat 10] [--only pio_app] [--output result.json]
+#
+# For each module of library/ and each transport installed here, a new
+# interpreter imports the module and opens the transport like a task would,
+# without sending a request:
+#   startup    seconds of the whole process (best of --repeat)
+#   import     seconds of the module import
+#   transport  seconds of the transport setup, with the imports it pulls in
+#   loaded     number and bytes of the python files the transport loaded
+#   payload    bytes of the module with the module_utils it imports, zipped
+#              like AnsiballZ ships them, the packages imported from the
+#              target (requests, urllib3, ...) are not part of it
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import argparse
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import timeit
+import zipfile
+
+import ansible.module_utils
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROLE_DIR = os.path.dirname(TESTS_DIR)
+TRANSPORTS = ('requests', 'urls', 'asyncio')
+MODULE_UTILS_IMPORT = re.compile(
+    r'^\s*(?:from|import)\s+ansible\.module_utils\.([\w.]+)', re.M)
+
+# run by a new interpreter, prints the JSON of its timings
+CHILD = r'''
+import json, os, sys, timeit
+start = timeit.default_timer()
+import importlib.util
+import ansible.module_utils
+ansible.module_utils.__path__.append(%(module_utils)r)
+spec = importlib.util.spec_from_file_location(%(name)r, %(path)r)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = timeit.default_timer()
+
+before = set(sys.modules)
+transport = %(transport)r
+if transport == 'requests':
+    from ansible.module_utils.prest_module import get_session
+    get_session('https://stub:443')
+elif transport == 'urls':
+    from ansible.module_utils.prest_urls import get_urls_transport
+    get_urls_transport('https://stub:443')
+else:
+    from ansible.module_utils.prest_async import get_async_transport
+    get_async_transport()
+ready = timeit.default_timer()
+
+files = [getattr(sys.modules[name], '__file__', None)
+         for name in set(sys.modules) - before]
+files = [f for f in files if f and os.path.isfile(f)]
+print(json.dumps({'import': imported - start, 'transport': ready - imported,
+                  'loaded_modules': len(files),
+                  'loaded_bytes': sum(os.path.getsize(f) for f in files)}))
+'''
+
+
+def module_utils_file(name):
+    # path of ansible.module_utils.<name>, the role's one first
+    for directory in ansible.module_utils.__path__:
+        for path in (os.path.join(directory, *name.split('.')) + '.py',
+                     os.path.join(directory, *name.split('.'))
+                     + '/__init__.py'):
+            if os.path.isfile(path):
+                return path
+
+    return None
+
+
+def payload_size(path):
+    # zipped bytes of path and of the module_utils it imports, recursively
+    files = set()
+    todo = [path]
+    while todo:
+        path = todo.pop()
+        if path in files:
+            continue
+        files.add(path)
+        with open(path) as f:
+            for name in MODULE_UTILS_IMPORT.findall(f.read()):
+                # ansible.module_utils.a.b may be a module or a name of a
+                parts = name.split('.')
+                for idx in range(len(parts), 0, -1):
+                    found = module_utils_file('.'.join(parts[:idx]))
+                    if found is not None:
+                        todo.append(found)
+                        break
+
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(files):
+            zf.write(path)
+
+    return len(data.getvalue())
+
+
+def installed(transport):
+    module = {'requests': 'requests', 'urls': 'ansible.module_utils.urls',
+              'asyncio': 'asyncio'}[transport]
+    code = 'import %s' % module
+
+    return subprocess.call([sys.executable, '-c', code],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL) == 0
+
+
+def measure(name, transport, repeat):
+    code = CHILD % dict(module_utils=os.path.join(ROLE_DIR, 'module_utils'),
+                        name=name, transport=transport,
+                        path=os.path.join(ROLE_DIR, 'library', name + '.py'))
+    best = None
+    for idx in range(0, repeat):
+        start = timeit.default_timer()
+        out = subprocess.check_output([sys.executable, '-c', code])
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best['startup']:
+            best = json.loads(out.decode('utf-8'))
+            best['startup'] = elapsed
+
+    return dict((key, round(value, 6) if isinstance(value, float) else value)
+                for key, value in best.items())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--only', help='regex of the modules to measure')
+    parser.add_argument('--output', help='JSON file of the result')
+    args = parser.parse_args()
+
+    ansible.module_utils.__path__.insert(0, os.path.join(ROLE_DIR,
+                                                         'module_utils'))
+    transports = [t for t in TRANSPORTS if installed(t)]
+    missing = sorted(set(TRANSPORTS) - set(transports))
+    if missing:
+        print('warning: not installed, not measured: %s' % ', '.join(missing),
+              file=sys.stderr)
+
+    result = dict()
+    for filename in sorted(os.listdir(os.path.join(ROLE_DIR, 'library'))):
+        name, ext = os.path.splitext(filename)
+        if ext != '.py' or not name.startswith('pio_') or \
+                (args.only and not re.search(args.only, name)):
+            continue
+        path = os.path.join(ROLE_DIR, 'library', filename)
+        result[name] = {'payload': payload_size(path)}
+        for transport in transports:
+            result[name][transport] = measure(name, transport, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    json.dump(result, sys.stdout, indent=2, sort_keys=True)
+    print()
+
+
+if __name__ == '__main__':
+    main()